@@ -0,0 +1,246 @@
+'''
+Epidemic modelling
+
+Benchmarks for the simulation engines in sir.py
+
+Generates cities of increasing size with a controlled share of infected
+and recovered people, times run_simulation and
+calc_avg_days_to_zero_infections with each engine along with the batched
+runner and the vaccine effectiveness sweep, and saves the results as JSON
+so that runs from different versions of the code can be compared.
+
+Sample: python3 benchmark.py --sizes=1000,10000,100000 --output=bench.json
+'''
+
+import json
+import platform
+import time
+
+import click
+import numpy as np
+
+import sir
+
+
+def generate_city(size, infected_density, recovered_density, seed):
+    '''
+    Generate a city in compact form
+
+    Inputs:
+      size (int): the number of people in the city
+      infected_density (float): the share of people who start out
+        infected (on their first day)
+      recovered_density (float): the share of people who start out
+        recovered
+      seed (int): the seed for the generator
+
+    Returns tuple (ndarray of int8, ndarray of int16): the state code of
+      each person and the number of days each infected person has been
+      infected
+    '''
+    rng = np.random.default_rng(seed)
+    draws = rng.random(size)
+    states = np.full(size, sir.SUSCEPTIBLE, dtype=np.int8)
+    states[draws < infected_density + recovered_density] = sir.RECOVERED
+    states[draws < infected_density] = sir.INFECTED
+
+    return (states, np.zeros(size, dtype=np.int16))
+
+
+def time_call(function, repeat):
+    '''
+    Time a function, keeping the best of several runs
+
+    Inputs:
+      function (function): the function to call, with no arguments
+      repeat (int): the number of times to call it
+
+    Returns tuple (float, value): the shortest time in seconds and the
+      value returned by the last call
+    '''
+    best = None
+    for __ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return (best, result)
+
+
+def make_record(benchmark, engine, size, seconds, days):
+    '''
+    Build one benchmark result
+
+    Inputs:
+      benchmark (string): the name of the function that was timed
+      engine (string): the engine that was used
+      size (int): the number of people in the city
+      seconds (float): the time taken
+      days (int): the total number of days simulated, over all trials
+
+    Returns (dictionary): the result
+    '''
+    person_days = size * days
+    return {"benchmark": benchmark,
+            "engine": engine,
+            "size": size,
+            "seconds": seconds,
+            "days": days,
+            "person_days": person_days,
+            "person_days_per_second": person_days / seconds if seconds else None}
+
+
+def run_benchmarks(sizes, infected_density, recovered_density,
+                   vaccine_effectiveness, days_contagious, num_trials,
+                   max_list_size, repeat, seed, max_batched_size=None,
+                   sweep_values=(0.0, 0.25, 0.5, 0.75)):
+    '''
+    Time every engine on a city of each size
+
+    Inputs:
+      sizes (list of ints): the city sizes to try
+      infected_density (float): the share of people who start out infected
+      recovered_density (float): the share of people who start out recovered
+      vaccine_effectiveness (float): the chance that a vaccination will be
+        effective, which is the share of susceptible people vaccinated
+      days_contagious (int): the number of a days a person is infected
+      num_trials (int): the number of trials for the averaging benchmarks
+      max_list_size (int): the largest city to run through the engines
+        that start from a list of strings.  Larger cities are only run
+        through the compact engines.
+      repeat (int): the number of times to run each benchmark
+      seed (int): the seed for generating cities and for the simulations
+      max_batched_size (int): the largest city to run through the
+        batched runner and the sweep, which keep one copy of the city per
+        trial or effectiveness value.  None means max_list_size.
+      sweep_values (list of floats): the vaccine effectiveness values for
+        the sweep
+
+    Returns (list of dictionaries): one result per benchmark
+    '''
+    if max_batched_size is None:
+        max_batched_size = max_list_size
+    results = []
+
+    for size in sizes:
+        states, days = generate_city(size, infected_density,
+                                     recovered_density, seed)
+        city = sir.decode_city(states, days) if size <= max_list_size else None
+
+        for engine in sir.ENGINES:
+            if engine == "list":
+                if city is None:
+                    continue
+                initial_state = sir.SimulationState(city, engine)
+            else:
+                initial_state = sir.SimulationState.from_arrays(states, days,
+                                                                engine)
+
+            if city is not None:
+                seconds, (__, num_days) = time_call(
+                    lambda: sir.run_simulation(city, days_contagious, seed,
+                                               vaccine_effectiveness, engine),
+                    repeat)
+                results.append(make_record("run_simulation", engine, size,
+                                           seconds, num_days))
+
+            seconds, final_state = time_call(
+                lambda: sir.run_trial(initial_state, days_contagious, seed,
+                                      vaccine_effectiveness),
+                repeat)
+            results.append(make_record("run_trial", engine, size, seconds,
+                                       final_state.days_simulated))
+
+            seconds, avg_days = time_call(
+                lambda: sir.calc_avg_days_to_zero_infections(
+                    initial_state, days_contagious, seed,
+                    vaccine_effectiveness, num_trials),
+                repeat)
+            results.append(make_record("calc_avg_days_to_zero_infections",
+                                       engine, size, seconds,
+                                       round(avg_days * num_trials)))
+
+        if size > max_batched_size:
+            continue
+        # The batched runner and the sweep start from a list of strings
+        batched_city = city if city is not None else sir.decode_city(states, days)
+        seeds = list(range(seed, seed + num_trials))
+
+        seconds, trials = time_call(
+            lambda: sir.run_simulations_batched(batched_city, days_contagious,
+                                                seeds, vaccine_effectiveness),
+            repeat)
+        results.append(make_record("run_simulations_batched", "batched",
+                                   size, seconds,
+                                   sum(num_days for __, num_days in trials)))
+
+        seconds, (__, trial_days) = time_call(
+            lambda: sir.sweep_vaccine_effectiveness(batched_city, days_contagious,
+                                                    seeds, sweep_values,
+                                                    return_trials=True),
+            repeat)
+        results.append(make_record("sweep_vaccine_effectiveness", "batched",
+                                   size, seconds, int(trial_days.sum())))
+
+    return results
+
+
+@click.command(name="benchmark")
+@click.option("--sizes", default="1000,10000,100000,1000000,10000000",
+              help="Comma-separated city sizes")
+@click.option("--infected-density", default=0.001, type=float)
+@click.option("--recovered-density", default=0.0, type=float)
+@click.option("--vaccine-effectiveness", default=0.5, type=float,
+              help="Share of susceptible people vaccinated")
+@click.option("--days-contagious", default=3, type=int)
+@click.option("--num-trials", default=5, type=int)
+@click.option("--max-list-size", default=100000, type=int,
+              help="Largest city to run through the list-of-strings paths")
+@click.option("--max-batched-size", default=1000000, type=int,
+              help="Largest city to run through the batched runner and sweep")
+@click.option("--sweep-values", default="0.0,0.25,0.5,0.75",
+              help="Comma-separated vaccine effectiveness values to sweep")
+@click.option("--repeat", default=1, type=int,
+              help="Number of runs per benchmark (the best is kept)")
+@click.option("--seed", default=sir.TEST_SEED, type=int)
+@click.option("--output", default="benchmark.json", type=click.Path())
+def cmd(sizes, infected_density, recovered_density, vaccine_effectiveness,
+        days_contagious, num_trials, max_list_size, max_batched_size,
+        sweep_values, repeat, seed, output):
+    '''
+    Run the benchmarks, print a summary and save the results.
+    '''
+    sizes = [int(size) for size in sizes.split(",")]
+    sweep_values = [float(value) for value in sweep_values.split(",")]
+    results = run_benchmarks(sizes, infected_density, recovered_density,
+                             vaccine_effectiveness, days_contagious,
+                             num_trials, max_list_size, repeat, seed,
+                             max_batched_size, sweep_values)
+
+    for result in results:
+        print("{:<34} {:<9} {:>10} {:>10.4f}s {:>14.0f} person-days/s".format(
+            result["benchmark"], result["engine"], result["size"],
+            result["seconds"], result["person_days_per_second"] or 0))
+
+    report = {"python": platform.python_version(),
+              "numpy": np.__version__,
+              "parameters": {"sizes": sizes,
+                             "infected_density": infected_density,
+                             "recovered_density": recovered_density,
+                             "vaccine_effectiveness": vaccine_effectiveness,
+                             "days_contagious": days_contagious,
+                             "num_trials": num_trials,
+                             "max_list_size": max_list_size,
+                             "max_batched_size": max_batched_size,
+                             "sweep_values": sweep_values,
+                             "repeat": repeat,
+                             "seed": seed},
+              "results": results}
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    cmd()  # pylint: disable=no-value-for-parameter
@@ -6,13 +6,54 @@ FLYNN RICHARDSON
 Functions for running a simple epidemiological simulation
 '''
 
+import csv
+import os
 import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import click
+import numpy as np
 
 # This seed should be used for debugging purposes only!  Do not refer
 # to it in your code.
 TEST_SEED = 20170217
 
+# State codes used by the array-backed engine.  Each person is stored as
+# one int8 code plus an int16 count of the days they have been infected.
+SUSCEPTIBLE = 0
+INFECTED = 1
+RECOVERED = 2
+VACCINATED = 3
+STATE_LABELS = np.array(['S', 'I', 'R', 'V'], dtype=object)
+
+ENGINES = ("list", "array", "frontier")
+
+# Layout of a city file: the magic string, the number of people as a
+# little-endian uint64, one int8 state code per person and then, starting
+# at the next even offset, one little-endian int16 days-infected count per
+# person.
+CITY_FILE_MAGIC = b"SIRCITY1"
+CITY_FILE_HEADER = len(CITY_FILE_MAGIC) + 8
+
+# Cities read from a city file that are longer than this are summarized
+# rather than printed by cmd
+MAX_PRINTED_CITY = 100
+
+# What an observer of a simulation is told about each day: the day
+# number, how many people are in each state at the end of the day and how
+# long each phase took, in seconds.  Day 0 describes the city right after
+# vaccination.
+DayStats = namedtuple("DayStats",
+                      ["day", "susceptible", "infected", "recovered",
+                       "vaccinated", "vaccinate_time", "step_time",
+                       "count_time"])
+PHASES = ("vaccinate", "step", "count")
+
+# When trials run in a process pool, split them into about this many
+# tasks per worker so that each task covers a batch of seeds.
+TASKS_PER_WORKER = 4
+
 def count_infected(city):
     '''
     Count the number of infected people
@@ -97,18 +138,710 @@ def simulate_one_day(starting_city, days_contagious):
     Returns:
       new_city (list): disease state of the city after one day
     '''
+    return simulate_one_day_with_counts(starting_city, days_contagious)[0]
+
+
+def simulate_one_day_with_counts(starting_city, days_contagious):
+    '''
+    Move the simulation forward a single day and count how many people
+    changed state along the way.
+
+    Inputs:
+      starting_city (list): the state of all people in the simulation at the
+        start of the day
+      days_contagious (int): the number of a days a person is infected
+
+    Returns tuple (list of strings, int, int): disease state of the city
+      after one day, the number of people newly infected and the number
+      of people newly recovered
+    '''
     # It is better to create a new list than make a copy of starting city
     # because of algorithmic complexity 
     new_city = []
+    newly_infected = 0
+    newly_recovered = 0
 
-    for position, __ in enumerate(starting_city):
-        new_city.append(advance_person_at_position(starting_city, position, days_contagious))
-    
-    return new_city
+    for position, person in enumerate(starting_city):
+        new_person = advance_person_at_position(starting_city, position, days_contagious)
+        if person == 'S' and new_person == 'I0':
+            newly_infected += 1
+        elif person[0] == 'I' and new_person == 'R':
+            newly_recovered += 1
+        new_city.append(new_person)
+
+    return (new_city, newly_infected, newly_recovered)
+
+
+def encode_city(city):
+    '''
+    Convert a city into the compact form used by the array-backed engine
+
+    Inputs:
+      city (list of strings): the state of all people in the city
+
+    Returns tuple (ndarray of int8, ndarray of int16): the state code of
+      each person and the number of days each infected person has been
+      infected (zero for everyone else)
+    '''
+    labels = np.asarray(city, dtype=str)
+    states = np.full(labels.shape, SUSCEPTIBLE, dtype=np.int8)
+    days = np.zeros(labels.shape, dtype=np.int16)
+
+    infected = np.char.startswith(labels, 'I')
+    states[infected] = INFECTED
+    states[labels == 'R'] = RECOVERED
+    states[labels == 'V'] = VACCINATED
+    days[infected] = np.char.lstrip(labels[infected], 'I').astype(np.int16)
+
+    return (states, days)
+
+
+def decode_city(states, days):
+    '''
+    Convert a city in compact form back into a list of strings
+
+    Inputs:
+      states (ndarray of int8): the state code of each person
+      days (ndarray of int16): the number of days each infected person
+        has been infected
+
+    Returns (list of strings): the state of all people in the city
+    '''
+    city = STATE_LABELS[states]
+    infected = np.flatnonzero(states == INFECTED)
+    city[infected] = ['I' + str(d) for d in days[infected].tolist()]
+
+    return city.tolist()
+
+
+def write_city_file(filename, states, days):
+    '''
+    Save a city in compact form to a city file
+
+    Inputs:
+      filename (string): the name of the file to write
+      states (ndarray of int8): the state code of each person
+      days (ndarray of int16): the number of days each infected person
+        has been infected
+    '''
+    num_people = states.size
+    with open(filename, "wb") as f:
+        f.write(CITY_FILE_MAGIC)
+        f.write(np.array(num_people, dtype='<u8').tobytes())
+        f.write(np.ascontiguousarray(states, dtype=np.int8).tobytes())
+        if (CITY_FILE_HEADER + num_people) % 2:
+            f.write(b"\0")
+        f.write(np.ascontiguousarray(days, dtype='<i2').tobytes())
+
+
+def read_city_file(filename):
+    '''
+    Load a city file written by write_city_file.  The file is memory
+    mapped copy-on-write, so changes to the city are never saved to the
+    file.  Every state code is checked as the city is loaded.
+
+    Inputs:
+      filename (string): the name of the file to read
+
+    Returns tuple (ndarray of int8, ndarray of int16): the state code of
+      each person and the number of days each infected person has been
+      infected
+    '''
+    with open(filename, "rb") as f:
+        header = f.read(CITY_FILE_HEADER)
+    if len(header) != CITY_FILE_HEADER or \
+       not header.startswith(CITY_FILE_MAGIC):
+        raise ValueError(filename + " is not a city file")
+
+    num_people = int(np.frombuffer(header[len(CITY_FILE_MAGIC):], dtype='<u8')[0])
+    days_offset = CITY_FILE_HEADER + num_people + (CITY_FILE_HEADER + num_people) % 2
+    expected_size = days_offset + 2 * num_people
+    actual_size = os.path.getsize(filename)
+    if actual_size != expected_size:
+        raise ValueError("{} should be {} bytes for {} people, but is {} bytes"
+                         .format(filename, expected_size, num_people, actual_size))
+    if num_people == 0:
+        return (np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int16))
+
+    states = np.memmap(filename, dtype=np.int8, mode='c',
+                       offset=CITY_FILE_HEADER, shape=(num_people,))
+    days = np.memmap(filename, dtype='<i2', mode='c',
+                     offset=days_offset, shape=(num_people,))
+    if np.any((states < SUSCEPTIBLE) | (states > VACCINATED)):
+        raise ValueError(filename + " contains an unknown state code")
+
+    return (states, days)
+
+
+def draw_uniforms(num_draws, rng=random):
+    '''
+    Draw random numbers from a Python random number generator in bulk.
+
+    The values, and the state of the generator afterwards, are exactly the
+    same as calling rng.random() num_draws times, so the array-backed
+    engine stays in lock step with the list-based one.
+
+    Inputs:
+      num_draws (int): the number of values to draw
+      rng: the random module or a random.Random instance
+
+    Returns (ndarray of floats): the values drawn
+    '''
+    version, internal_state, gauss_next = rng.getstate()
+    mersenne_twister = np.random.RandomState()
+    mersenne_twister.set_state(
+        ('MT19937', np.array(internal_state[:-1], dtype=np.uint32),
+         internal_state[-1]))
+
+    draws = mersenne_twister.random_sample(num_draws)
+
+    __, key, pos, __, __ = mersenne_twister.get_state()
+    rng.setstate((version, tuple(key.tolist()) + (pos,), gauss_next))
+
+    return draws
+
+
+def vaccinate_states(states, vaccine_effectiveness, rng=random):
+    '''
+    Vaccinate everyone in a city in compact form.  Modifies states in place.
+
+    Inputs:
+      states (ndarray of int8): the state code of each person
+      vaccine_effectiveness (float): the chance that a vaccination will be
+        effective
+      rng: the random module or a random.Random instance
+    '''
+    susceptible = np.flatnonzero(states == SUSCEPTIBLE)
+    draws = draw_uniforms(susceptible.size, rng)
+    states[susceptible[draws < vaccine_effectiveness]] = VACCINATED
+
+
+class LineTopology(object):
+    '''
+    People standing in a line: each person's neighbors are the people
+    directly to their left and right.
+    '''
+    def __init__(self, size):
+        '''
+        Constructor
+
+        Inputs:
+          size (int): the number of people
+        '''
+        self.size = size
+
+    def exposed(self, infected):
+        '''
+        Find the people who have an infected neighbor
+
+        Inputs:
+          infected (ndarray of booleans): whether each person is infected.
+            This may also be a 2D array holding one city per row.
+
+        Returns (ndarray of booleans): whether each person has an infected
+          neighbor
+        '''
+        exposed = np.zeros_like(infected)
+        exposed[..., 1:] |= infected[..., :-1]
+        exposed[..., :-1] |= infected[..., 1:]
+        return exposed
+
+    def neighbors(self, positions):
+        '''
+        Find the people who have someone at one of the positions as a
+        neighbor
+
+        Inputs:
+          positions (ndarray of ints): positions of people
+
+        Returns (ndarray of ints): the positions of those people, possibly
+          with repeats
+        '''
+        neighbors = np.concatenate((positions - 1, positions + 1))
+        return neighbors[(neighbors >= 0) & (neighbors < self.size)]
+
+
+class GridTopology(object):
+    '''
+    People living on a 2D grid, stored row by row.  Each person's
+    neighbors are the people above, below, to the left and to the right
+    (von Neumann neighborhood) or the eight people around them (Moore
+    neighborhood).
+    '''
+    OFFSETS = {"von_neumann": ((-1, 0), (1, 0), (0, -1), (0, 1)),
+               "moore": ((-1, -1), (-1, 0), (-1, 1), (0, -1),
+                         (0, 1), (1, -1), (1, 0), (1, 1))}
+
+    def __init__(self, rows, cols, neighborhood="von_neumann"):
+        '''
+        Constructor
+
+        Inputs:
+          rows (int): the number of rows in the grid
+          cols (int): the number of columns in the grid
+          neighborhood (string): "von_neumann" or "moore"
+        '''
+        if neighborhood not in self.OFFSETS:
+            raise ValueError("neighborhood must be one of: " +
+                             ", ".join(self.OFFSETS))
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.offsets = self.OFFSETS[neighborhood]
+
+    def exposed(self, infected):
+        '''
+        Find the people who have an infected neighbor
+
+        Inputs:
+          infected (ndarray of booleans): whether each person is infected.
+            This may also be a 2D array holding one city per row.
+
+        Returns (ndarray of booleans): whether each person has an infected
+          neighbor
+        '''
+        grid = infected.reshape(infected.shape[:-1] + (self.rows, self.cols))
+        exposed = np.zeros_like(grid)
+        for (di, dj) in self.offsets:
+            # exposed[i, j] |= grid[i + di, j + dj], wherever both exist
+            exposed[..., max(0, -di):self.rows - max(0, di),
+                    max(0, -dj):self.cols - max(0, dj)] |= \
+                grid[..., max(0, di):self.rows - max(0, -di),
+                     max(0, dj):self.cols - max(0, -dj)]
+        return exposed.reshape(infected.shape)
+
+    def neighbors(self, positions):
+        '''
+        Find the people who have someone at one of the positions as a
+        neighbor
+
+        Inputs:
+          positions (ndarray of ints): positions of people
+
+        Returns (ndarray of ints): the positions of those people, possibly
+          with repeats
+        '''
+        rows, cols = np.divmod(positions, self.cols)
+        neighbors = []
+        for (di, dj) in self.offsets:
+            inside = ((rows + di >= 0) & (rows + di < self.rows) &
+                      (cols + dj >= 0) & (cols + dj < self.cols))
+            neighbors.append(positions[inside] + di * self.cols + dj)
+        return np.concatenate(neighbors)
+
+
+class GraphTopology(object):
+    '''
+    People connected by an arbitrary contact network, given as a
+    compressed sparse row (CSR) adjacency structure: the neighbors of
+    person i are indices[indptr[i]:indptr[i + 1]].
+    '''
+    def __init__(self, indptr, indices):
+        '''
+        Constructor
+
+        Inputs:
+          indptr (ndarray of ints): where each person's neighbors start in
+            indices (one entry per person, plus one)
+          indices (ndarray of ints): the neighbors of every person
+        '''
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.size = self.indptr.size - 1
+
+        # The transpose, for finding the people who list a given person
+        # as a neighbor
+        owners = np.repeat(np.arange(self.size), np.diff(self.indptr))
+        self.reverse_indices = owners[np.argsort(self.indices, kind="stable")]
+        self.reverse_indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.size),
+                  out=self.reverse_indptr[1:])
+
+    @classmethod
+    def from_edges(cls, size, edges, directed=False):
+        '''
+        Build a contact network from a list of edges
+
+        Inputs:
+          size (int): the number of people
+          edges (list of pairs of ints): (i, j) makes j a neighbor of i
+          directed (boolean): if False, each edge also makes i a neighbor
+            of j
+
+        Returns (GraphTopology): the contact network
+        '''
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if not directed:
+            edges = np.concatenate((edges, edges[:, ::-1]))
+        edges = edges[np.argsort(edges[:, 0], kind="stable")]
+
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=size), out=indptr[1:])
+        return cls(indptr, edges[:, 1])
+
+    def exposed(self, infected):
+        '''
+        Find the people who have an infected neighbor
+
+        Inputs:
+          infected (ndarray of booleans): whether each person is infected.
+            This may also be a 2D array holding one city per row.
+
+        Returns (ndarray of booleans): whether each person has an infected
+          neighbor
+        '''
+        # The number of infected neighbors is the sparse matrix-vector
+        # product of the adjacency matrix and infected, computed as
+        # differences of a running sum over the edges.
+        running = np.zeros(infected.shape[:-1] + (self.indices.size + 1,),
+                           dtype=np.int64)
+        np.cumsum(infected[..., self.indices], axis=-1, out=running[..., 1:])
+        return running[..., self.indptr[1:]] > running[..., self.indptr[:-1]]
+
+    def neighbors(self, positions):
+        '''
+        Find the people who have someone at one of the positions as a
+        neighbor
+
+        Inputs:
+          positions (ndarray of ints): positions of people
+
+        Returns (ndarray of ints): the positions of those people, possibly
+          with repeats
+        '''
+        starts = self.reverse_indptr[positions]
+        lengths = self.reverse_indptr[positions + 1] - starts
+        # Line up each position's slice of reverse_indices end to end
+        ends = np.cumsum(lengths)
+        edges = np.arange(ends[-1] if ends.size else 0) + \
+            np.repeat(starts - (ends - lengths), lengths)
+        return self.reverse_indices[edges]
+
+
+def as_topology(topology, size):
+    '''
+    Fill in the default neighbor structure: a line
+
+    Inputs:
+      topology: a LineTopology, GridTopology, GraphTopology or None
+      size (int): the number of people in the city
+
+    Returns: the topology
+    '''
+    if topology is None:
+        return LineTopology(size)
+    if topology.size != size:
+        raise ValueError("topology is for {} people, but the city has {}"
+                         .format(topology.size, size))
+    return topology
+
+
+def simulate_one_day_array(states, days, days_contagious, topology=None):
+    '''
+    Move a city in compact form forward a single day.  Modifies states
+    and days in place.
+
+    Inputs:
+      states (ndarray of int8): the state code of each person.  This may
+        also be a 2D array holding one city per row, in which case every
+        row is moved forward independently.
+      days (ndarray of int16): the number of days each infected person
+        has been infected
+      days_contagious (int): the number of a days a person is infected
+      topology: who is whose neighbor (see as_topology)
+
+    Returns tuple (int, int): the number of people newly infected and the
+      number of people newly recovered (arrays with one count per row
+      for a 2D city)
+    '''
+    infected = states == INFECTED
+    exposed = as_topology(topology, states.shape[-1]).exposed(infected)
+    newly_infected = exposed & (states == SUSCEPTIBLE)
+
+    days += infected
+    recovered = infected & (days >= days_contagious)
+    states[recovered] = RECOVERED
+    states[newly_infected] = INFECTED
+    days[newly_infected] = 0
+
+    if states.ndim == 1:
+        return (int(np.count_nonzero(newly_infected)),
+                int(np.count_nonzero(recovered)))
+    return (np.count_nonzero(newly_infected, axis=-1),
+            np.count_nonzero(recovered, axis=-1))
+
+
+def run_batched(states, days, days_contagious, topology=None):
+    '''
+    Run the simulation for several cities of the same size at once.  Every
+    city moves forward together and drops out of the batch as soon as it
+    has no infected people.  Modifies states and days in place.
+
+    Inputs:
+      states (2D ndarray of int8): the state code of each person, one
+        city per row
+      days (2D ndarray of int16): the number of days each infected person
+        has been infected
+      days_contagious (int): the number of a days a person is infected
+      topology: who is whose neighbor (see as_topology)
+
+    Returns (ndarray of ints): the number of days simulated for each city
+    '''
+    topology = as_topology(topology, states.shape[-1])
+    num_infected = np.count_nonzero(states == INFECTED, axis=1)
+    days_simulated = np.zeros(states.shape[0], dtype=np.int64)
+
+    active = np.flatnonzero(num_infected)
+    active_states = states[active]
+    active_days = days[active]
+    num_infected = num_infected[active]
+
+    while active.size:
+        newly_infected, newly_recovered = \
+            simulate_one_day_array(active_states, active_days, days_contagious,
+                                   topology)
+        num_infected += newly_infected - newly_recovered
+        days_simulated[active] += 1
+
+        finished = num_infected == 0
+        if finished.any():
+            states[active[finished]] = active_states[finished]
+            days[active[finished]] = active_days[finished]
+            unfinished = ~finished
+            active = active[unfinished]
+            active_states = active_states[unfinished]
+            active_days = active_days[unfinished]
+            num_infected = num_infected[unfinished]
+
+    return days_simulated
+
+
+def simulate_one_day_frontier(states, days, infected, days_contagious,
+                              topology=None):
+    '''
+    Move a city in compact form forward a single day, looking only at the
+    people who are infected and their neighbors.  Modifies states and
+    days in place.
+
+    Inputs:
+      states (ndarray of int8): the state code of each person
+      days (ndarray of int16): the number of days each infected person
+        has been infected
+      infected (ndarray of ints): the positions of the infected people
+      days_contagious (int): the number of a days a person is infected
+      topology: who is whose neighbor (see as_topology)
+
+    Returns tuple (ndarray of ints, int, int): the positions of the people
+      who are infected at the end of the day, the number of people newly
+      infected and the number of people newly recovered
+    '''
+    # Only the neighbors of an infected person can become infected
+    neighbors = as_topology(topology, states.size).neighbors(infected)
+    newly_infected = np.unique(neighbors[states[neighbors] == SUSCEPTIBLE])
+
+    days[infected] += 1
+    still_infected = days[infected] < days_contagious
+    states[infected[~still_infected]] = RECOVERED
+    states[newly_infected] = INFECTED
+    days[newly_infected] = 0
+
+    return (np.concatenate((infected[still_infected], newly_infected)),
+            newly_infected.size, infected.size - int(np.count_nonzero(still_infected)))
+
+
+class SimulationState(object):
+    '''
+    A city part way through a simulation, along with a running count of
+    the people who are infected, so that the simulation never has to
+    rescan the city to decide whether to keep going.
+    '''
+    def __init__(self, city, engine="list", topology=None):
+        '''
+        Constructor
+
+        Inputs:
+          city (list of strings): the state of all people in the city
+          engine (string): the simulation engine to use (see ENGINES)
+          topology: who is whose neighbor (see as_topology).  The list
+            engine only supports the default line.
+        '''
+        if engine not in ENGINES:
+            raise ValueError("engine must be one of: " + ", ".join(ENGINES))
+        if engine == "list" and topology is not None and \
+           not isinstance(topology, LineTopology):
+            raise ValueError("the list engine only supports a line of people")
+
+        self.engine = engine
+        self.topology = topology
+        self.days_simulated = 0
+        if engine == "list":
+            self.city = city
+            self.num_infected = count_infected(city)
+        else:
+            self._set_arrays(*encode_city(city))
+
+    @classmethod
+    def from_arrays(cls, states, days, engine="array", topology=None):
+        '''
+        Build a state from a city that is already in compact form, for
+        example one loaded with read_city_file.
+
+        Inputs:
+          states (ndarray of int8): the state code of each person
+          days (ndarray of int16): the number of days each infected
+            person has been infected
+          engine (string): the simulation engine to use (see ENGINES)
+          topology: who is whose neighbor (see as_topology)
+
+        Returns (SimulationState): the new state
+        '''
+        if engine == "list":
+            return cls(decode_city(states, days), engine, topology)
+
+        state = cls([], engine)
+        state.topology = topology
+        state._set_arrays(states, days)
+        return state
+
+    def _set_arrays(self, states, days):
+        '''
+        Use a city in compact form as the state of the simulation.
+        '''
+        self.topology = as_topology(self.topology, states.size)
+        self.states = states
+        self.days = days
+        infected = np.flatnonzero(states == INFECTED)
+        self.num_infected = infected.size
+        if self.engine == "frontier":
+            self.infected = infected
+
+    def copy(self):
+        '''
+        Make an independent copy of the state, for example to start a new
+        trial from the same city without parsing it again.
+        '''
+        other = object.__new__(SimulationState)
+        other.__dict__.update(self.__dict__)
+        if self.engine == "list":
+            other.city = self.city[:]
+        else:
+            other.states = self.states.copy()
+            other.days = self.days.copy()
+            if self.engine == "frontier":
+                other.infected = self.infected.copy()
+        return other
+
+    def vaccinate(self, vaccine_effectiveness, rng=random):
+        '''
+        Vaccinate everyone in the city.  Vaccination never changes who is
+        infected, so the running count stays valid.
+
+        Inputs:
+          vaccine_effectiveness (float): the chance that a vaccination will
+            be effective
+          rng: the random module or a random.Random instance
+        '''
+        if self.engine == "list":
+            self.city = vaccinate_city(self.city, vaccine_effectiveness)
+        else:
+            vaccinate_states(self.states, vaccine_effectiveness, rng)
+
+    def step(self, days_contagious):
+        '''
+        Move the simulation forward a single day.
+
+        Inputs:
+          days_contagious (int): the number of a days a person is infected
+
+        Returns tuple (int, int): the number of people newly infected and
+          the number of people newly recovered
+        '''
+        if self.engine == "list":
+            self.city, newly_infected, newly_recovered = \
+                simulate_one_day_with_counts(self.city, days_contagious)
+        elif self.engine == "array":
+            newly_infected, newly_recovered = \
+                simulate_one_day_array(self.states, self.days, days_contagious,
+                                       self.topology)
+        else:
+            self.infected, newly_infected, newly_recovered = \
+                simulate_one_day_frontier(self.states, self.days,
+                                          self.infected, days_contagious,
+                                          self.topology)
+
+        self.num_infected += newly_infected - newly_recovered
+        self.days_simulated += 1
+        return (newly_infected, newly_recovered)
+
+    def count_states(self):
+        '''
+        Count the number of people in each state.
+
+        Returns (list of ints): the number of people who are susceptible,
+          infected, recovered and vaccinated
+        '''
+        if self.engine == "list":
+            codes = {'S': SUSCEPTIBLE, 'I': INFECTED, 'R': RECOVERED,
+                     'V': VACCINATED}
+            counts = [0, 0, 0, 0]
+            for person in self.city:
+                counts[codes[person[0]]] += 1
+            return counts
+        return np.bincount(self.states, minlength=len(STATE_LABELS)).tolist()
+
+    def run(self, days_contagious, observer=None, vaccinate_time=0.0):
+        '''
+        Move the simulation forward until nobody is infected.
+
+        Inputs:
+          days_contagious (int): the number of a days a person is infected
+          observer (function): called with a DayStats for the starting
+            state and again after every day.  The cost of counting and
+            timing is only paid when there is an observer.
+          vaccinate_time (float): the time spent vaccinating the city, to
+            report in the first DayStats
+        '''
+        if observer is None:
+            while self.num_infected:
+                self.step(days_contagious)
+            return
+
+        start = time.perf_counter()
+        counts = self.count_states()
+        observer(DayStats(self.days_simulated, *counts, vaccinate_time, 0.0,
+                          time.perf_counter() - start))
+
+        while self.num_infected:
+            start = time.perf_counter()
+            newly_infected, newly_recovered = self.step(days_contagious)
+            stepped = time.perf_counter()
+            counts[SUSCEPTIBLE] -= newly_infected
+            counts[INFECTED] = self.num_infected
+            counts[RECOVERED] += newly_recovered
+            observer(DayStats(self.days_simulated, *counts, 0.0,
+                              stepped - start, time.perf_counter() - stepped))
+
+    def to_city(self):
+        '''
+        Returns (list of strings): the state of all people in the city
+        '''
+        if self.engine == "list":
+            return self.city
+        return decode_city(self.states, self.days)
+
+    def to_arrays(self):
+        '''
+        Returns tuple (ndarray of int8, ndarray of int16): the state of all
+          people in the city in compact form
+        '''
+        if self.engine == "list":
+            return encode_city(self.city)
+        return (self.states, self.days)
 
 
 def run_simulation(starting_city, days_contagious,
-                   random_seed=None, vaccine_effectiveness=0.0):
+                   random_seed=None, vaccine_effectiveness=0.0,
+                   engine="list", observer=None, topology=None):
     '''
     Run the entire simulation
 
@@ -119,21 +852,136 @@ def run_simulation(starting_city, days_contagious,
       random_seed (int): the random seed to use for the simulation
       vaccine_effectiveness (float): the chance that a vaccination will be
         effective
+      engine (string): "list" to step the list of strings directly,
+        "array" to step the compact form or "frontier" to step only the
+        infected people and their neighbors.  All give identical results.
+      observer (function): called with a DayStats after vaccination and
+        after every day (see SimulationState.run)
+      topology: who is whose neighbor (see as_topology).  The list
+        engine only supports the default line.
 
     Returns tuple (list of strings, int): the final state of the city
       and the number of days actually simulated.
     '''
-    days_simulated = 0
+    state = run_trial(SimulationState(starting_city, engine, topology),
+                      days_contagious, random_seed, vaccine_effectiveness,
+                      observer)
+    return (state.to_city(), state.days_simulated)
+
+
+def run_simulations_batched(starting_city, days_contagious, random_seeds,
+                            vaccine_effectiveness=0.0, topology=None):
+    '''
+    Run one simulation per seed, with all of the trials laid out as the
+    rows of a single 2D array and moved forward together.  Each trial has
+    its own random number generator, so its result is the same as
+    calling run_simulation with that seed.  Unlike run_simulation, the
+    global random number generator is left alone.
+
+    Inputs:
+      starting_city (list): the state of all people in the city at the
+        start of the simulation
+      days_contagious (int): the number of a days a person is infected
+      random_seeds (list of ints): the random seed to use for each trial
+      vaccine_effectiveness (float): the chance that a vaccination will be
+        effective
+      topology: who is whose neighbor (see as_topology)
+
+    Returns (list of tuples (list of strings, int)): the final state of the
+      city and the number of days simulated for each trial
+    '''
+    states, days = encode_city(starting_city)
+    susceptible = np.flatnonzero(states == SUSCEPTIBLE)
+    batch_states = np.tile(states, (len(random_seeds), 1))
+    batch_days = np.tile(days, (len(random_seeds), 1))
+
+    for trial, random_seed in enumerate(random_seeds):
+        draws = draw_uniforms(susceptible.size, random.Random(random_seed))
+        batch_states[trial, susceptible[draws < vaccine_effectiveness]] = VACCINATED
+
+    days_simulated = run_batched(batch_states, batch_days, days_contagious,
+                                 topology)
+
+    return [(decode_city(batch_states[trial], batch_days[trial]), num_days)
+            for trial, num_days in enumerate(days_simulated.tolist())]
+
+
+def as_simulation_state(starting_city, engine="list", topology=None):
+    '''
+    Wrap a city in a SimulationState, unless it already is one
+
+    Inputs:
+      starting_city (list or SimulationState): the city
+      engine (string): the simulation engine to use for a list
+      topology: who is whose neighbor for a list (see as_topology)
+
+    Returns (SimulationState): the state for the city
+    '''
+    if isinstance(starting_city, SimulationState):
+        return starting_city
+    return SimulationState(starting_city, engine, topology)
+
+
+def run_trial(initial_state, days_contagious, random_seed,
+              vaccine_effectiveness, observer=None):
+    '''
+    Run the entire simulation starting from a copy of an existing state
+
+    Inputs:
+      initial_state (SimulationState): the state of the city at the
+        start of the simulation.  It is not modified.
+      days_contagious (int): the number of a days a person is infected
+      random_seed (int): the random seed to use for the simulation
+      vaccine_effectiveness (float): the chance that a vaccination will be
+        effective
+      observer (function): called with a DayStats after vaccination and
+        after every day (see SimulationState.run)
+
+    Returns (SimulationState): the final state of the simulation
+    '''
     # When using a seed, must call random.seed() before any randomizing 
     # function or calling functions that use a randomizing function
-    random.seed(random_seed) 
-    vaccinated_city = vaccinate_city(starting_city, vaccine_effectiveness)
+    random.seed(random_seed)
+    state = initial_state.copy()
+    start = time.perf_counter()
+    state.vaccinate(vaccine_effectiveness)
+    state.run(days_contagious, observer, time.perf_counter() - start)
 
-    while count_infected(vaccinated_city):
-        vaccinated_city = simulate_one_day(vaccinated_city, days_contagious)
-        days_simulated += 1
-    
-    return (vaccinated_city, days_simulated)
+    return state
+
+
+class SimulationProfile(object):
+    '''
+    An observer that keeps the DayStats for every day of a simulation
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self.days = []
+
+    def __call__(self, day_stats):
+        self.days.append(day_stats)
+
+    def phase_totals(self):
+        '''
+        Returns (dictionary): the total time spent in each phase, in seconds
+        '''
+        return {phase: sum(getattr(day_stats, phase + "_time")
+                           for day_stats in self.days)
+                for phase in PHASES}
+
+    def write_curve(self, filename):
+        '''
+        Save the epidemic curve (one row of DayStats per day) as a CSV file
+
+        Inputs:
+          filename (string): the name of the file to write
+        '''
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(DayStats._fields)
+            writer.writerows(self.days)
 
 
 def vaccinate_city(starting_city, vaccine_effectiveness):
@@ -163,18 +1011,48 @@ def vaccinate_city(starting_city, vaccine_effectiveness):
     return vaccinated_city
 
 
+def count_days_for_seeds(starting_city, days_contagious, first_seed,
+                         num_seeds, vaccine_effectiveness, engine="list",
+                         topology=None):
+    '''
+    Run one simulation for each of a consecutive range of seeds and
+    add up the number of days simulated
+
+    Inputs:
+      starting_city (list or SimulationState): the state of all people in
+        the city at the start of the simulation
+      days_contagious (int): the number of a days a person is infected
+      first_seed (int): the seed to use for the first simulation
+      num_seeds (int): the number of simulations to run
+      vaccine_effectiveness (float): the chance that a vaccination will be
+        effective
+      engine (string): the simulation engine to use
+      topology: who is whose neighbor (see as_topology)
+
+    Returns (int): the total number of days simulated
+    '''
+    total_days = 0
+    initial_state = as_simulation_state(starting_city, engine, topology)
+
+    for random_seed in range(first_seed, first_seed + num_seeds):
+        total_days += run_trial(initial_state, days_contagious, random_seed,
+                                vaccine_effectiveness).days_simulated
+
+    return total_days
+
+
 def calc_avg_days_to_zero_infections(
         starting_city, days_contagious,
         random_seed, vaccine_effectiveness,
-        num_trials):
+        num_trials, engine="list", workers=None, topology=None):
     '''
     Conduct N trials with the specified vaccine effectiveness and
     calculate the average number of days for a city to reach zero
     infections
 
     Inputs:
-      starting_city (list): the state of all people in the city at the
-        start of the simulation
+      starting_city (list or SimulationState): the state of all people in
+        the city at the start of the simulation
       days_contagious (int): the number of a days a person is infected
       random_seed (int): the starting random seed. Use this value for
         the FIRST simulation, and then increment it once for each
@@ -182,64 +1060,188 @@ def calc_avg_days_to_zero_infections(
       vaccine_effectiveness (float): the chance that a vaccination will be
         effective
       num_trials (int): the number of trials to run
+      engine (string): the simulation engine to use (see run_simulation)
+      workers (int): the number of processes to spread the trials
+        across.  None or 1 runs the trials in this process.
+      topology: who is whose neighbor (see as_topology).  The list
+        engine only supports the default line.
 
     Returns (float): the average number of days for a city to reach zero
       infections
     '''
     assert num_trials > 0
 
-    total_infections = 0
+    if workers is None or workers <= 1:
+        total_infections = 0
+        # Parse the city once and start every trial from a copy
+        initial_state = as_simulation_state(starting_city, engine, topology)
+
+        # Do not name variables that are unused in a function
+        for __ in range(num_trials):
+            total_infections += run_trial(initial_state, days_contagious, random_seed,
+                                          vaccine_effectiveness).days_simulated
+            random_seed += 1
+
+        return total_infections / num_trials
+
+    # Each trial has its own seed, so the trials are independent.  Give
+    # each task a batch of consecutive seeds to keep the IPC overhead low.
+    num_tasks = min(num_trials, workers * TASKS_PER_WORKER)
+    batch_size, num_larger = divmod(num_trials, num_tasks)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        first_seed = random_seed
+        for task in range(num_tasks):
+            num_seeds = batch_size + (1 if task < num_larger else 0)
+            futures.append(executor.submit(
+                count_days_for_seeds, starting_city, days_contagious,
+                first_seed, num_seeds, vaccine_effectiveness, engine,
+                topology))
+            first_seed += num_seeds
+        total_infections = sum(future.result() for future in futures)
 
-    # Do not name variables that are unused in a function
-    for __ in range(num_trials):
-        total_infections += run_simulation(starting_city, days_contagious, random_seed, vaccine_effectiveness)[1]
-        random_seed += 1
-    
     return total_infections / num_trials
 
+
+def sweep_vaccine_effectiveness(city, days_contagious, seeds,
+                                effectiveness_values, return_trials=False,
+                                topology=None):
+    '''
+    Compute the average number of days for a city to reach zero
+    infections for many vaccine effectiveness values at once.
+
+    For a given seed, everyone who is susceptible draws the same random
+    number whatever the effectiveness, so the draws are made once per
+    seed and each effectiveness value becomes a threshold on them.  The
+    cities for all of the effectiveness values then move forward together
+    as one 2D batch (one row per value, so memory grows with the number
+    of values times the size of the city).
+
+    Inputs:
+      city (list of strings): the state of all people in the city at the
+        start of the simulation
+      days_contagious (int): the number of a days a person is infected
+      seeds (list of ints): the random seed to use for each trial
+      effectiveness_values (list of floats): the vaccine effectiveness
+        values to try
+      return_trials (boolean): whether to also return the number of days
+        for every trial
+      topology: who is whose neighbor (see as_topology)
+
+    Returns (list of floats): the average number of days for each
+      effectiveness value, matching calc_avg_days_to_zero_infections run
+      with the same seeds.  If return_trials is True, returns a tuple of
+      this list and an ndarray with one row per effectiveness value and
+      one column per seed holding the number of days for each trial.
+    '''
+    assert len(seeds) > 0
+
+    states, days = encode_city(city)
+    susceptible = np.flatnonzero(states == SUSCEPTIBLE)
+    thresholds = np.asarray(effectiveness_values, dtype=float)
+    trial_days = np.zeros((thresholds.size, len(seeds)), dtype=np.int64)
+
+    for trial, random_seed in enumerate(seeds):
+        draws = draw_uniforms(susceptible.size, random.Random(random_seed))
+        batch_states = np.tile(states, (thresholds.size, 1))
+        batch_days = np.tile(days, (thresholds.size, 1))
+
+        rows, cols = np.nonzero(draws < thresholds[:, np.newaxis])
+        batch_states[rows, susceptible[cols]] = VACCINATED
+
+        trial_days[:, trial] = run_batched(batch_states, batch_days,
+                                           days_contagious, topology)
+
+    averages = [total / len(seeds) for total in trial_days.sum(axis=1).tolist()]
+    if return_trials:
+        return (averages, trial_days)
+    return averages
+
 ################ Do not change the code below this line #######################
 
 
 @click.command()
-@click.argument("city", type=str)
+@click.argument("city", type=str, required=False)
 @click.option("--days-contagious", default=2, type=int)
 @click.option("--random_seed", default=None, type=int)
 @click.option("--vaccine-effectiveness", default=0.0, type=float)
 @click.option("--num-trials", default=1, type=int)
 @click.option("--task-type", default="single",
               type=click.Choice(['single', 'average']))
+@click.option("--engine", default="list", type=click.Choice(ENGINES))
+@click.option("--workers", default=1, type=int)
+@click.option("--city-file", default=None, type=click.Path(exists=True),
+              help="Read the city from a city file instead of CITY")
+@click.option("--output-file", default=None, type=click.Path(),
+              help="Save the final city of a single run as a city file")
+@click.option("--profile", is_flag=True,
+              help="Print how long each phase of a single run took")
+@click.option("--curve-file", default=None, type=click.Path(),
+              help="Save the per-day counts of a single run as a CSV file")
 def cmd(city, days_contagious, random_seed, vaccine_effectiveness,
-        num_trials, task_type):
+        num_trials, task_type, engine, workers, city_file, output_file,
+        profile, curve_file):
     '''
     Process the command-line arguments and do the work.
     '''
 
-    # Convert the city string into a city list.
-    city = [p.strip() for p in city.split(",")]
-    emsg = ("Error: people in the city must be susceptible ('S'),"
-            " recovered ('R'), or infected ('Ix', where *x* is an integer")
-    for p in city:
-        if p[0] == "I":
-            try:
-                _ = int(p[1])
-            except ValueError:
+    if city_file is not None:
+        try:
+            initial_state = SimulationState.from_arrays(
+                *read_city_file(city_file), engine=engine)
+        except ValueError as e:
+            print("Error:", e)
+            return -1
+    elif city is None:
+        print("Error: specify either a city or a city file")
+        return -1
+    else:
+        # Convert the city string into a city list.
+        city = [p.strip() for p in city.split(",")]
+        emsg = ("Error: people in the city must be susceptible ('S'),"
+                " recovered ('R'), or infected ('Ix', where *x* is an integer")
+        for p in city:
+            if p[0] == "I":
+                try:
+                    _ = int(p[1])
+                except ValueError:
+                    print(emsg)
+                    return -1
+            elif p not in {"S", "R"}:
                 print(emsg)
                 return -1
-        elif p not in {"S", "R"}:
-            print(emsg)
-            return -1
+        initial_state = SimulationState(city, engine)
 
     if task_type == "single":
         print("Running one simulation...")
-        final_city, num_days_simulated = run_simulation(
-            city, days_contagious, random_seed, vaccine_effectiveness)
-        print("Final city:", final_city)
-        print("Days simulated:", num_days_simulated)
+        observer = None
+        if profile or curve_file is not None:
+            observer = SimulationProfile()
+        final_state = run_trial(initial_state, days_contagious, random_seed,
+                                vaccine_effectiveness, observer)
+        states, days = final_state.to_arrays()
+        if city_file is None or states.size <= MAX_PRINTED_CITY:
+            print("Final city:", final_state.to_city())
+        else:
+            counts = np.bincount(states, minlength=len(STATE_LABELS))
+            print("Final city: {} susceptible, {} recovered, {} vaccinated"
+                  .format(counts[SUSCEPTIBLE], counts[RECOVERED],
+                          counts[VACCINATED]))
+        print("Days simulated:", final_state.days_simulated)
+        if output_file is not None:
+            write_city_file(output_file, states, days)
+        if curve_file is not None:
+            observer.write_curve(curve_file)
+        if profile:
+            print("Time per phase:")
+            for phase, total in observer.phase_totals().items():
+                print("  {:<10} {:.6f}s".format(phase, total))
     else:
         print("Running multiple trials...")
         avg_days = calc_avg_days_to_zero_infections(
-            city, days_contagious, random_seed, vaccine_effectiveness,
-            num_trials)
+            initial_state, days_contagious, random_seed, vaccine_effectiveness,
+            num_trials, engine, workers)
         msg = ("Over {} trial(s), on average, it took {:3.1f} days for the "
                "number of infections to reach zero")
         print(msg.format(num_trials, avg_days))
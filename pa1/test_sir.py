@@ -16,6 +16,7 @@ import os
 import sys
 import random
 
+import numpy as np
 import pytest
 
 import sir
@@ -305,7 +306,7 @@ def test_simulate_one_day(params):
 
 ###### Task: run simulation over multiple days  ######
 
-def __test_run_simulation(params):
+def __test_run_simulation(params, engine="list"):
     '''
     Test harness for run_simulation
 
@@ -314,12 +315,14 @@ def __test_run_simulation(params):
         seed, city, maximum number of days to simulate,
         infection rate, number of days contagious
         expected result
+      engine (string): the simulation engine to use
     '''
 
     actual = sir.run_simulation(params["starting_city"],
                                 params["days_contagious"],
                                 params["random_seed"],
-                                params["vaccine_effectiveness"]
+                                params["vaccine_effectiveness"],
+                                engine=engine
                                 )
 
     recreate_msg = "To recreate this test run:\n"
@@ -334,6 +337,8 @@ def __test_run_simulation(params):
                                            params["random_seed"],
                                            params["vaccine_effectiveness"]
                                            )
+    if engine != "list":
+        recreate_msg = recreate_msg[:-1] + ", engine='{}')".format(engine)
 
     assert actual is not None, \
         gen_none_error(recreate_msg)
@@ -367,6 +372,202 @@ def __test_run_simulation(params):
 def test_run_simulation(params):
     __test_run_simulation(params)
 
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("run_simulation_tests.json") +
+    read_config_file("simulation_with_vaccine.json"))
+@pytest.mark.parametrize("engine", ["array", "frontier"])
+def test_run_simulation_engines(params, engine):
+    __test_run_simulation(params, engine=engine)
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("simulate_one_day_tests.json"))
+def test_simulate_one_day_array(params):
+    '''
+    Check that the array-backed day step agrees with simulate_one_day
+    '''
+    states, days = sir.encode_city(params["city"])
+    sir.simulate_one_day_array(states, days, params["days_contagious"])
+    actual_city = sir.decode_city(states, days)
+
+    assert actual_city == params["expected_city"], \
+        gen_mismatch_error("", params["expected_city"], actual_city)
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("simulate_one_day_tests.json"))
+def test_simulate_one_day_frontier(params):
+    '''
+    Check that the frontier day step agrees with simulate_one_day
+    '''
+    states, days = sir.encode_city(params["city"])
+    infected = np.flatnonzero(states == sir.INFECTED)
+    infected, __, __ = sir.simulate_one_day_frontier(
+        states, days, infected, params["days_contagious"])
+    actual_city = sir.decode_city(states, days)
+
+    assert actual_city == params["expected_city"], \
+        gen_mismatch_error("", params["expected_city"], actual_city)
+    assert sorted(infected.tolist()) == \
+        [i for i, p in enumerate(actual_city) if p[0] == "I"]
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("simulate_one_day_tests.json"))
+@pytest.mark.parametrize("engine", sir.ENGINES)
+def test_simulation_state_step(params, engine):
+    '''
+    Check that the running infected count kept by SimulationState
+    matches a rescan of the city
+    '''
+    state = sir.SimulationState(params["city"], engine)
+    newly_infected, newly_recovered = state.step(params["days_contagious"])
+    actual_city = state.to_city()
+
+    assert actual_city == params["expected_city"], \
+        gen_mismatch_error("", params["expected_city"], actual_city)
+    assert state.num_infected == sir.count_infected(actual_city)
+    assert newly_infected == sum(1 for before, after
+                                 in zip(params["city"], actual_city)
+                                 if before == "S" and after == "I0")
+    assert newly_recovered == sum(1 for before, after
+                                  in zip(params["city"], actual_city)
+                                  if before[0] == "I" and after == "R")
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("calc_avg_days_to_zero_infections.json"))
+def test_run_simulations_batched(params):
+    '''
+    Check that running the trials as one batch gives the same result for
+    every seed as run_simulation
+    '''
+    seeds = list(range(params["starting_seed"],
+                       params["starting_seed"] + params["num_trials"]))
+
+    actual = sir.run_simulations_batched(params["starting_city"],
+                                         params["days_contagious"],
+                                         seeds,
+                                         params["vaccine_effectiveness"])
+
+    expected = [sir.run_simulation(params["starting_city"],
+                                   params["days_contagious"],
+                                   random_seed,
+                                   params["vaccine_effectiveness"])
+                for random_seed in seeds]
+    assert actual == expected, \
+        gen_mismatch_error("", expected, actual)
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("simulate_one_day_tests.json"))
+def test_city_file_round_trip(params, tmp_path):
+    '''
+    Check that a city survives being written to and read from a city file
+    '''
+    filename = str(tmp_path / "city.sir")
+    sir.write_city_file(filename, *sir.encode_city(params["city"]))
+    actual_city = sir.decode_city(*sir.read_city_file(filename))
+
+    assert actual_city == params["city"], \
+        gen_mismatch_error("", params["city"], actual_city)
+
+@pytest.mark.parametrize("num_people", [0, 1, 2, 5])
+@pytest.mark.parametrize("size_change", [-1, 1])
+def test_city_file_wrong_size(num_people, size_change, tmp_path):
+    '''
+    Check that a city file that is too short or too long is rejected
+    '''
+    filename = str(tmp_path / "city.sir")
+    sir.write_city_file(filename, *sir.encode_city(["S"] * num_people))
+    with open(filename, "rb") as f:
+        data = f.read()
+    with open(filename, "wb") as f:
+        f.write(data[:size_change] if size_change < 0 else data + b"\0")
+
+    with pytest.raises(ValueError):
+        sir.read_city_file(filename)
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("simulation_with_vaccine.json"))
+@pytest.mark.parametrize("engine", sir.ENGINES)
+def test_run_simulation_observer(params, engine):
+    '''
+    Check that an observer sees one DayStats per day with counts that
+    match the final city
+    '''
+    profile = sir.SimulationProfile()
+    actual_city, actual_num_days = sir.run_simulation(
+        params["starting_city"], params["days_contagious"],
+        params["random_seed"], params["vaccine_effectiveness"],
+        engine=engine, observer=profile)
+
+    assert [day_stats.day for day_stats in profile.days] == \
+        list(range(actual_num_days + 1))
+    last = profile.days[-1]
+    assert last.infected == 0
+    assert (last.susceptible, last.recovered, last.vaccinated) == \
+        (actual_city.count("S"), actual_city.count("R"),
+         actual_city.count("V"))
+    assert set(profile.phase_totals()) == set(sir.PHASES)
+
+def line_topologies(size):
+    '''
+    Build grid and graph topologies that describe the same line of
+    people as the default topology.
+    '''
+    edges = [(i, i + 1) for i in range(size - 1)]
+    return [sir.GridTopology(1, size, "von_neumann"),
+            sir.GridTopology(size, 1, "moore"),
+            sir.GraphTopology.from_edges(size, edges)]
+
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("run_simulation_tests.json") +
+    read_config_file("simulation_with_vaccine.json"))
+@pytest.mark.parametrize("engine", ["array", "frontier"])
+def test_run_simulation_topology(params, engine):
+    '''
+    Check that grids and graphs shaped like a line give the same results
+    as the default line
+    '''
+    expected = tuple(params["expected"])
+    for topology in line_topologies(len(params["starting_city"])):
+        actual = sir.run_simulation(params["starting_city"],
+                                    params["days_contagious"],
+                                    params["random_seed"],
+                                    params["vaccine_effectiveness"],
+                                    engine=engine, topology=topology)
+        assert actual == expected, \
+            gen_mismatch_error("", expected, actual)
+
+
+def test_grid_topology_moore():
+    '''
+    Check that a Moore neighborhood reaches the diagonals and a von
+    Neumann neighborhood does not
+    '''
+    city = ["S", "S", "S",
+            "S", "I0", "S",
+            "S", "S", "S"]
+    von_neumann = sir.GridTopology(3, 3, "von_neumann")
+    moore = sir.GridTopology(3, 3, "moore")
+
+    states, days = sir.encode_city(city)
+    sir.simulate_one_day_array(states, days, 2, von_neumann)
+    assert sir.decode_city(states, days) == ["S", "I0", "S",
+                                             "I0", "I1", "I0",
+                                             "S", "I0", "S"]
+
+    states, days = sir.encode_city(city)
+    sir.simulate_one_day_array(states, days, 2, moore)
+    assert sir.decode_city(states, days) == ["I0", "I0", "I0",
+                                             "I0", "I1", "I0",
+                                             "I0", "I0", "I0"]
+
 ###### Task: vaccinate a city ######
 
 @pytest.mark.parametrize(
@@ -475,3 +676,50 @@ def test_calc_avg_days_to_zero_infections(params):
         gen_mismatch_error(recreate_msg,
                            params["expected"],
                            actual)
+
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("calc_avg_days_to_zero_infections.json"))
+def test_calc_avg_days_to_zero_infections_workers(params):
+    '''
+    Check that spreading the trials across processes gives the same
+    average as running them one after another
+    '''
+    actual = sir.calc_avg_days_to_zero_infections(
+        params["starting_city"],
+        params["days_contagious"],
+        params["starting_seed"],
+        params["vaccine_effectiveness"],
+        params["num_trials"],
+        workers=2)
+
+    assert actual == pytest.approx(params["expected"]), \
+        gen_mismatch_error("", params["expected"], actual)
+
+
+@pytest.mark.parametrize(
+    "params",
+    read_config_file("calc_avg_days_to_zero_infections.json"))
+def test_sweep_vaccine_effectiveness(params):
+    '''
+    Check that a sweep over several effectiveness values agrees with
+    calc_avg_days_to_zero_infections for each value
+    '''
+    seeds = list(range(params["starting_seed"],
+                       params["starting_seed"] + params["num_trials"]))
+    effectiveness_values = [params["vaccine_effectiveness"], 0.0, 0.5, 1.0]
+
+    averages, trial_days = sir.sweep_vaccine_effectiveness(
+        params["starting_city"], params["days_contagious"], seeds,
+        effectiveness_values, return_trials=True)
+
+    assert averages[0] == pytest.approx(params["expected"]), \
+        gen_mismatch_error("", params["expected"], averages[0])
+    assert trial_days.shape == (len(effectiveness_values), len(seeds))
+    for vaccine_effectiveness, actual in zip(effectiveness_values, averages):
+        expected = sir.calc_avg_days_to_zero_infections(
+            params["starting_city"], params["days_contagious"],
+            params["starting_seed"], vaccine_effectiveness,
+            params["num_trials"])
+        assert actual == expected
@@ -25,13 +25,312 @@ CS121: Schelling Model of Housing Segregation
          --sim_lb=0.40 --sim_ub=0.7 --patience=3 --max_steps=1
   The sample command is shown on two lines, but should be entered on
   a single line in the linux command-line
+
+  The sweep subcommand does a simulation for every combination of
+  comma-separated parameters and saves the results as a CSV file:
+
+  Sample: python3 schelling.py sweep --grid_file=tests/large-grid.txt
+         --r=1,2,3 --sim_lb=0.35,0.40 --sim_ub=0.70,0.75 --patience=1,3
+         --max_steps=100 --workers=4 --output=sweep.csv
 """
 
+import csv
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
 import click
+import numpy as np
 import utility
 
+# A checkpoint file holds the magic number, a header of 64-bit values (N,
+# the number of homes for sale, the relocations and steps so far, whether
+# the simulation has finished, R, the patience and the two bounds of the
+# satisfaction range), the array grid and then the locations of the homes
+# for sale, in order, as pairs of 32-bit values.
+CHECKPOINT_MAGIC = b"SCHCKPT1"
+CHECKPOINT_HEADER = len(CHECKPOINT_MAGIC) + 9 * 8
+Checkpoint = namedtuple("Checkpoint",
+                        ["grid", "homes_for_sale", "relocations", "steps",
+                         "finished", "R", "sim_sat_range", "patience"])
+
+# What an observer of a simulation is told after each step: the step
+# number, the relocations made and time taken (in seconds) by the maroon
+# and blue waves, how many homeowners of each color are unsatisfied at the
+# end of the step and how many homes are for sale.
+StepStats = namedtuple("StepStats",
+                       ["step", "maroon_relocations", "blue_relocations",
+                        "maroon_unsatisfied", "blue_unsatisfied",
+                        "maroon_time", "blue_time", "homes_for_sale"])
+
+
+class NeighborhoodCounts(object):
+    '''
+    For every location in the grid, the number of homeowners of each
+    color and the number of occupied homes in the R-neighborhood of the
+    location.  This lets is_satisfied answer in O(1) instead of scanning
+    the neighborhood.  The counts must be kept up to date by passing them
+    to swap_homes whenever a homeowner moves, which costs O(R^2).
+    '''
+    def __init__(self, grid, R, count_arrays=None):
+        '''
+        Constructor
+
+        Inputs:
+            grid (list of lists of strings or array grid): the grid
+            R (int): neighborhood parameter
+            count_arrays: the counts as arrays (see count_arrays), if
+              they have already been computed
+        '''
+        self.R = R
+        self.size = len(grid)
+        self.for_sale = home_value(grid, 'F')
+
+        if count_arrays is None:
+            count_arrays = self.count_arrays(grid, R)
+        same_color, occupied = count_arrays
+        self.occupied = occupied.tolist()
+        self.same_color = {color: counts.tolist()
+                           for color, (__, counts) in same_color.items()}
+
+    @staticmethod
+    def count_arrays(grid, R):
+        '''
+        Count the neighborhood of every location at once (see
+        neighborhood_sums).
+
+        Inputs:
+            grid (list of lists of strings or array grid): the grid
+            R (int): neighborhood parameter
+
+        Returns: (dictionary, ndarray of ints) a map from each homeowner
+          color in the grid, as stored in the grid, to an array that
+          marks the homes of that color and an array of the number of
+          homeowners of that color in the neighborhood of each location,
+          and an array of the number of occupied homes in the
+          neighborhood of each location
+        '''
+        array = grid
+        if not isinstance(grid, np.ndarray):
+            array = utility.grid_to_array(grid)
+
+        is_occupied = array != utility.GRID_CODES['F']
+        same_color = {}
+        for code in np.unique(array[is_occupied]).tolist():
+            has_color = array == code
+            color = code if isinstance(grid, np.ndarray) else utility.GRID_VALUES[code]
+            same_color[color] = (has_color, neighborhood_sums(has_color, R))
+
+        return (same_color, neighborhood_sums(is_occupied, R))
+
+    def add(self, color, location, delta):
+        '''
+        Add delta homeowners of a color at a location to the counts of
+        every location in its R-neighborhood.
+
+        Inputs:
+            color (string): the color of the homeowner
+            location (int, int): the location of the homeowner
+            delta (int): 1 when a homeowner arrives, -1 when they leave
+        '''
+        if color not in self.same_color:
+            self.same_color[color] = [[0] * self.size for __ in range(self.size)]
+        same_color = self.same_color[color]
+
+        (i, j) = location
+        for k in range(max(0, i - self.R), min(self.size, i + self.R + 1)):
+            width = self.R - abs(i - k)
+            same_color_row = same_color[k]
+            occupied_row = self.occupied[k]
+            for l in range(max(0, j - width), min(self.size, j + width + 1)):
+                same_color_row[l] += delta
+                occupied_row[l] += delta
+
+    def move(self, color, old_location, new_location):
+        '''
+        Update the counts when a homeowner moves.
+
+        Inputs:
+            color (string): the color of the homeowner
+            old_location (int, int): the home they left
+            new_location (int, int): the home they moved into
+        '''
+        self.add(color, old_location, -1)
+        self.add(color, new_location, 1)
+
+    def similarity(self, color, location):
+        '''
+        Count the homeowners of a color and the occupied homes in the
+        R-neighborhood of a location.
+
+        Inputs:
+            color (string): a homeowner color
+            location (int, int): a grid location
+
+        Returns: (int, int) the number of homeowners of the color and the
+          number of occupied homes
+        '''
+        (i, j) = location
+        return (self.same_color[color][i][j], self.occupied[i][j])
+
+
+class SatisfactionCache(NeighborhoodCounts):
+    '''
+    Neighborhood counts plus, for each color, the set of homeowners who
+    are currently unsatisfied.  A move only changes the counts inside the
+    R-neighborhoods of the two homes involved, so only the homeowners
+    there need their satisfaction checked again.  This lets a wave visit
+    just the unsatisfied homeowners instead of the whole grid.
+    '''
+    def __init__(self, grid, R, sim_sat_range):
+        '''
+        Constructor
+
+        Inputs:
+            grid (list of lists of strings): the grid.  The cache keeps a
+              reference to it, so it must be told about every move.
+            R (int): neighborhood parameter
+            sim_sat_range (float, float): lower bound and upper bound on
+              the range (inclusive) for when the homeowner is satisfied
+              with his similarity score.
+        '''
+        count_arrays = self.count_arrays(grid, R)
+        super().__init__(grid, R, count_arrays)
+        self.grid = grid
+        self.sim_sat_range = sim_sat_range
+        # (color, heap, cursor) for the wave in progress, if any
+        self.wave = None
+
+        same_color, occupied = count_arrays
+        self.unsatisfied = {}
+        for color, (has_color, counts) in same_color.items():
+            scores = np.zeros(occupied.shape)
+            np.divide(counts, occupied, out=scores, where=has_color)
+            is_unsatisfied = has_color & ((scores < min(sim_sat_range))
+                                          | (scores > max(sim_sat_range)))
+            self.unsatisfied[color] = {tuple(location) for location in
+                                       np.argwhere(is_unsatisfied).tolist()}
+
+    def refresh(self, location):
+        '''
+        Recheck whether the homeowner at a location is satisfied, and
+        update the sets of unsatisfied homeowners.
+
+        Inputs:
+            location (int, int): a grid location
+        '''
+        (i, j) = location
+        home = self.grid[i][j]
+        for color, unsatisfied in self.unsatisfied.items():
+            if color != home:
+                unsatisfied.discard(location)
+        if home == self.for_sale:
+            return
+
+        S, H = self.similarity(home, location)
+        if is_in_range(S / H, self.sim_sat_range):
+            self.unsatisfied[home].discard(location)
+        elif location not in self.unsatisfied.setdefault(home, set()):
+            self.unsatisfied[home].add(location)
+            if self.wave is not None:
+                color, heap, cursor = self.wave
+                index = i * self.size + j
+                if color == home and index > cursor[0]:
+                    heapq.heappush(heap, index)
+
+    def move(self, color, old_location, new_location):
+        '''
+        Update the counts and the unsatisfied sets when a homeowner moves.
+        The grid must already show the move.
+
+        Inputs:
+            color (string): the color of the homeowner
+            old_location (int, int): the home they left
+            new_location (int, int): the home they moved into
+        '''
+        super().move(color, old_location, new_location)
+        for (i, j) in (old_location, new_location):
+            for k in range(max(0, i - self.R), min(self.size, i + self.R + 1)):
+                width = self.R - abs(i - k)
+                for l in range(max(0, j - width), min(self.size, j + width + 1)):
+                    self.refresh((k, l))
+
+    def unsatisfied_in_order(self, color):
+        '''
+        Generate the locations of the unsatisfied homeowners of a color in
+        the same order as a row-by-row scan of the grid would find them,
+        even as homeowners move between steps of the generator: a
+        homeowner who becomes unsatisfied further along the scan is
+        visited, and one who becomes satisfied before being reached is
+        skipped.
+
+        Inputs:
+            color (string): a homeowner color
 
-def is_satisfied(grid, R, location, sim_sat_range):
+        Returns: generator of (int, int) locations
+        '''
+        heap = [i * self.size + j for (i, j) in self.unsatisfied.get(color, ())]
+        heapq.heapify(heap)
+        cursor = [-1]
+        self.wave = (color, heap, cursor)
+
+        try:
+            while heap:
+                index = heapq.heappop(heap)
+                if index <= cursor[0]:
+                    continue
+                location = divmod(index, self.size)
+                if location in self.unsatisfied.get(color, ()):
+                    cursor[0] = index
+                    yield location
+        finally:
+            self.wave = None
+
+
+class HomesForSale(object):
+    '''
+    The homes for sale, in the order homeowners visit them.  Taking a
+    home off the market and putting a vacated home at the front both take
+    O(1) time, where a list takes time proportional to its length.
+    '''
+    def __init__(self, locations=()):
+        '''
+        Constructor
+
+        Inputs:
+            locations (list of tuples): the homes for sale, in order
+        '''
+        self.locations = OrderedDict.fromkeys(locations)
+
+    def __iter__(self):
+        return iter(self.locations)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, location):
+        return location in self.locations
+
+    def relocate(self, sold_home, vacated_home):
+        '''
+        Record a relocation: the home that was bought comes off the market
+        and the home that was left goes on sale at the front.
+
+        Inputs:
+            sold_home (int, int): the location of the home that was bought
+            vacated_home (int, int): the location of the home that was left
+        '''
+        del self.locations[sold_home]
+        self.locations[vacated_home] = None
+        self.locations.move_to_end(vacated_home, last=False)
+
+
+def is_satisfied(grid, R, location, sim_sat_range, counts=None):
     '''
     Determine whether or not the homeowner at a specific location is
     satisfied using an R-neighborhood centered around the location.
@@ -39,17 +338,67 @@ def is_satisfied(grid, R, location, sim_sat_range):
     range (inclusive)
 
     Inputs:
-        grid: the grid
+        grid: the grid (a list of lists of strings or an array grid)
         R (int): neighborhood parameter
         location (int, int): a grid location
         sim_sat_range (float, float): lower bound and upper bound on
           the range (inclusive) for when the homeowner is satisfied
           with his similarity score.
+        counts (NeighborhoodCounts): precomputed neighborhood counts for
+          the grid, or None to scan the neighborhood
 
     Returns: bool
     '''
     (i, j) = location
-    assert grid[i][j] != 'F'
+    assert grid[i][j] != home_value(grid, 'F')
+
+    if counts is not None:
+        S, H = counts.similarity(grid[i][j], location)
+    else:
+        S, H = count_neighborhood(grid, R, location, grid[i][j])
+    
+    return is_in_range(S / H, sim_sat_range)
+
+
+def is_in_range(similarity_score, sim_sat_range):
+    '''
+    Determine whether a similarity score falls within the satisfaction
+    range (inclusive)
+
+    Inputs:
+        similarity_score (float): a similarity score
+        sim_sat_range (float, float): lower bound and upper bound on
+          the range
+
+    Returns: bool
+    '''
+    return similarity_score >= min(sim_sat_range) and similarity_score <= max(sim_sat_range)
+
+
+def count_neighborhood(grid, R, location, color):
+    '''
+    Scan the R-neighborhood of a location, counting the homeowners of a
+    color and the occupied homes.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid
+        R (int): neighborhood parameter
+        location (int, int): a grid location
+        color: a homeowner color, as stored in the grid
+
+    Returns: (int, int) the number of homeowners of the color and the
+      number of occupied homes
+    '''
+    (i, j) = location
+
+    if isinstance(grid, np.ndarray):
+        top, left = max(0, i - R), max(0, j - R)
+        homes = grid[top:i + R + 1, left:j + R + 1]
+        in_neighborhood = diamond(R)[top - i + R:top - i + R + homes.shape[0],
+                                     left - j + R:left - j + R + homes.shape[1]]
+        homes = homes[in_neighborhood]
+        return (int(np.count_nonzero(homes == color)),
+                int(np.count_nonzero(homes != utility.GRID_CODES['F'])))
 
     S = 0
     H = 0
@@ -59,29 +408,183 @@ def is_satisfied(grid, R, location, sim_sat_range):
             if abs(i - k) + abs(j - l) <= R:
                 if grid[k][l] != 'F':
                     H += 1
-                if grid[k][l] == grid[i][j]:
+                if grid[k][l] == color:
                     S += 1
-    
-    similarity_score = S / H
-    return similarity_score >= min(sim_sat_range) and similarity_score <= max(sim_sat_range)
 
+    return (S, H)
+
+
+@lru_cache(maxsize=None)
+def diamond(R):
+    '''
+    Build a mask of the R-neighborhood of the center of a
+    (2R + 1) x (2R + 1) block.
+
+    Inputs:
+        R (int): neighborhood parameter
+
+    Returns: (ndarray of bool) the mask
+    '''
+    offsets = np.abs(np.arange(-R, R + 1))
+    return offsets[:, np.newaxis] + offsets[np.newaxis, :] <= R
+
+
+def home_value(grid, home):
+    '''
+    Find the value that stands for a kind of home in a grid: the string
+    itself in a list of lists, or its code (see utility.GRID_CODES) in an
+    array grid.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid
+        home (string): 'B', 'M' or 'F'
+
+    Returns: the value
+    '''
+    if isinstance(grid, np.ndarray):
+        return utility.GRID_CODES[home]
+    return home
+
+
+def neighborhood_sums(values, R):
+    '''
+    Add up an array over the R-neighborhood of every location: a 2D
+    convolution with the diamond(R) kernel, treating locations off the
+    grid as 0.  Each row of the diamond is a horizontal window, so the sums
+    are taken as differences of running row sums, and stay exact.
+
+    Inputs:
+        values (2D ndarray of ints): the value at each location
+        R (int): neighborhood parameter
+
+    Returns: (2D ndarray of ints) the sums
+    '''
+    (rows, cols) = values.shape
+    padded = np.pad(values.astype(np.int64), R)
+    running = np.zeros((padded.shape[0], padded.shape[1] + 1), dtype=np.int64)
+    np.cumsum(padded, axis=1, out=running[:, 1:])
+
+    sums = np.zeros((rows, cols), dtype=np.int64)
+    for dk in range(-R, R + 1):
+        width = R - abs(dk)
+        band = running[R + dk:R + dk + rows]
+        sums += band[:, R + width + 1:R + width + 1 + cols]
+        sums -= band[:, R - width:R - width + cols]
+    return sums
+
+
+def count_neighborhoods(grid, R):
+    '''
+    For every location, count the homeowners of the same color as the
+    home at the location and the occupied homes in its R-neighborhood.
+    The counts at a location match count_neighborhood for the color of
+    the home there.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid
+        R (int): neighborhood parameter
+
+    Returns: (ndarray of ints, ndarray of ints) the number of homeowners
+      of the same color and the number of occupied homes.  Both are 0
+      at homes for sale.
+    '''
+    if not isinstance(grid, np.ndarray):
+        grid = utility.grid_to_array(grid)
+
+    for_sale = utility.GRID_CODES['F']
+    is_occupied = grid != for_sale
+    occupied = np.where(is_occupied, neighborhood_sums(is_occupied, R), 0)
+
+    same_color = np.zeros(grid.shape, dtype=np.int64)
+    for color in np.unique(grid[is_occupied]):
+        has_color = grid == color
+        same_color[has_color] = neighborhood_sums(has_color, R)[has_color]
+
+    return (same_color, occupied)
+
+
+def compute_satisfaction_map(grid, R, sim_sat_range):
+    '''
+    Determine whether every homeowner in the grid is satisfied, using
+    whole-grid neighborhood counts rather than calling is_satisfied
+    location by location.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid
+        R (int): neighborhood parameter
+        sim_sat_range (float, float): lower bound and upper bound on
+          the range (inclusive) for when the homeowner is satisfied
+          with his similarity score.
 
-def swap_homes(grid, open_location, unsatisfied_homeowner):
+    Returns: (ndarray of bool) whether the homeowner at each location is
+      satisfied.  Homes for sale are False.
+    '''
+    same_color, occupied = count_neighborhoods(grid, R)
+    is_occupied = occupied > 0
+    scores = np.zeros(occupied.shape)
+    np.divide(same_color, occupied, out=scores, where=is_occupied)
+
+    return (is_occupied & (scores >= min(sim_sat_range))
+            & (scores <= max(sim_sat_range)))
+
+
+def score_if_moved(grid, R, homeowner, target, counts=None):
+    '''
+    Compute the similarity score a homeowner would have if they moved to
+    an unoccupied home, without moving them.
+
+    Inputs:
+        grid (list of lists of strings): the grid
+        R (int): neighborhood parameter
+        homeowner (int, int): the location of the homeowner
+        target (int, int): the location of an unoccupied home
+        counts (NeighborhoodCounts): precomputed neighborhood counts for
+          the grid, or None to scan the neighborhood
+
+    Returns: (float) the similarity score at the target
+    '''
+    (i, j) = homeowner
+    (k, l) = target
+    color = grid[i][j]
+    assert grid[k][l] == home_value(grid, 'F')
+
+    if counts is not None:
+        S, H = counts.similarity(color, target)
+    else:
+        S, H = count_neighborhood(grid, R, target, color)
+
+    # The homeowner joins the target's neighborhood, and leaves it if their
+    # old home is part of it
+    S += 1
+    H += 1
+    if abs(i - k) + abs(j - l) <= R:
+        S -= 1
+        H -= 1
+
+    return S / H
+
+
+def swap_homes(grid, open_location, unsatisfied_homeowner, counts=None):
     '''
     Swaps an unsatisfied homeowner to an unoccupied home
 
     Inputs:
         open_location: (tuple) an unoccupied location
         unsatisfied_homeowner: (tuple) the location of an unsatisfied homeowner
+        counts (NeighborhoodCounts): neighborhood counts to keep up to
+          date, or None
     '''
     (i, j) = open_location
-    assert grid[i][j] == 'F'
+    assert grid[i][j] == home_value(grid, 'F')
     (k, l) = unsatisfied_homeowner
 
     grid[i][j], grid[k][l] = grid[k][l], grid[i][j]
+    if counts is not None:
+        counts.move(grid[i][j], unsatisfied_homeowner, open_location)
 
 
-def is_homeowner_relocated(grid, R, sim_sat_range, unsatisfied_homeowner, homes_for_sale, patience):
+def is_homeowner_relocated(grid, R, sim_sat_range, unsatisfied_homeowner, homes_for_sale, patience,
+                           counts=None):
     '''
     Tries to relocate an unsatisfied homeowner to a satisfactory home
 
@@ -92,32 +595,36 @@ def is_homeowner_relocated(grid, R, sim_sat_range, unsatisfied_homeowner, homes_
           the range (inclusive) for when the homeowner is satisfied
           with his similarity score.
         unsatisfied_homeowner (int, int): location of unsatisfied homeowner
-        homes_for_sale (list of tuples): a list of locations with homes for sale
+        homes_for_sale (HomesForSale or list of tuples): the locations with
+          homes for sale
         patience (int): the number of satisfactory homes an unsatisfied homeowner
            will visit before relocating
+        counts (NeighborhoodCounts): neighborhood counts for the grid, or None
 
     Returns: bool
     '''
-    assert not is_satisfied(grid, R, unsatisfied_homeowner, sim_sat_range)
+    assert not is_satisfied(grid, R, unsatisfied_homeowner, sim_sat_range, counts)
     is_relocated = False
 
     for open_home in homes_for_sale:
-        swap_homes(grid, open_home, unsatisfied_homeowner)
-        if is_satisfied(grid, R, open_home, sim_sat_range):
+        similarity_score = score_if_moved(grid, R, unsatisfied_homeowner, open_home, counts)
+        if is_in_range(similarity_score, sim_sat_range):
             patience -= 1
             if patience == 0:
-                homes_for_sale.remove(open_home)
-                homes_for_sale.insert(0, unsatisfied_homeowner)
+                swap_homes(grid, open_home, unsatisfied_homeowner, counts)
+                if isinstance(homes_for_sale, HomesForSale):
+                    homes_for_sale.relocate(open_home, unsatisfied_homeowner)
+                else:
+                    homes_for_sale.remove(open_home)
+                    homes_for_sale.insert(0, unsatisfied_homeowner)
                 is_relocated = True
                 break
-            swap_homes(grid, unsatisfied_homeowner, open_home)
-        else:
-            swap_homes(grid, unsatisfied_homeowner, open_home)
     
     return is_relocated
 
 
-def simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience, homeowner_color):
+def simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience, homeowner_color,
+                    counts=None):
     '''
     Performs a wave (based on homeowner color) of the simulation
 
@@ -127,25 +634,37 @@ def simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience, homeowner_
         sim_sat_range (float, float): lower bound and upper bound on
           the range (inclusive) for when the homeowner is satisfied
           with his similarity score.
-        homes_for_sale (list of tuples): a list of locations with homes for sale
+        homes_for_sale (HomesForSale or list of tuples): the locations with
+          homes for sale
         patience (int): the number of satisfactory homes an unsatisfied homeowner
           is willing to visit before making a decision
         homeowner_color (string): the color of a homeowner
+        counts (NeighborhoodCounts): neighborhood counts for the grid, or None.
+          With a SatisfactionCache, only the unsatisfied homeowners are visited.
         
     Returns: (int) number of relocations
     '''
     num_relocations = 0
 
+    if isinstance(counts, SatisfactionCache):
+        for location in counts.unsatisfied_in_order(homeowner_color):
+            if is_homeowner_relocated(grid, R, sim_sat_range, location, homes_for_sale, patience,
+                                      counts):
+                num_relocations += 1
+        return num_relocations
+
     for i, __ in enumerate(grid):
         for j, __ in enumerate(grid):
-            if grid[i][j] == homeowner_color and not is_satisfied(grid, R, (i, j), sim_sat_range):
-                if is_homeowner_relocated(grid, R, sim_sat_range, (i, j), homes_for_sale, patience):
+            if grid[i][j] == homeowner_color and \
+               not is_satisfied(grid, R, (i, j), sim_sat_range, counts):
+                if is_homeowner_relocated(grid, R, sim_sat_range, (i, j), homes_for_sale, patience,
+                                          counts):
                     num_relocations += 1
     
     return num_relocations
 
 
-def simulation_step(grid, R, sim_sat_range, homes_for_sale, patience):
+def simulation_step(grid, R, sim_sat_range, homes_for_sale, patience, counts=None):
     '''
     Performs a step of the simulation
 
@@ -155,46 +674,438 @@ def simulation_step(grid, R, sim_sat_range, homes_for_sale, patience):
         sim_sat_range (float, float): lower bound and upper bound on
           the range (inclusive) for when the homeowner is satisfied
           with his similarity score.
-        homes_for_sale (list of tuples): a list of locations with homes for sale
+        homes_for_sale (HomesForSale or list of tuples): the locations with
+          homes for sale
         patience (int): the number of satisfactory homes an unsatisfied homeowner
           is willing to visit before making a decision
+        counts (NeighborhoodCounts): neighborhood counts for the grid, or None
 
     Returns: (int) number of relocations
     '''
     num_relocations = 0
-    num_relocations += simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience, 'M')
-    num_relocations += simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience, 'B')
+    num_relocations += simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience,
+                                       home_value(grid, 'M'), counts)
+    num_relocations += simulation_wave(grid, R, sim_sat_range, homes_for_sale, patience,
+                                       home_value(grid, 'B'), counts)
     return num_relocations
 
 
-def do_simulation(grid, R, sim_sat_range, patience, max_steps, homes_for_sale):
+def simulation_step_with_stats(grid, R, sim_sat_range, homes_for_sale, patience,
+                               counts, step):
+    '''
+    Performs a step of the simulation (see simulation_step), timing each
+    wave.
+
+    Inputs:
+        counts (SatisfactionCache): the satisfaction cache for the grid,
+          which keeps the unsatisfied homeowners of each color
+        step (int): the number of the step
+
+    Returns: (StepStats) what happened during the step
+    '''
+    wave_stats = []
+    for color in ('M', 'B'):
+        start = time.perf_counter()
+        num_relocations = simulation_wave(grid, R, sim_sat_range, homes_for_sale,
+                                          patience, home_value(grid, color), counts)
+        wave_stats.append((num_relocations, time.perf_counter() - start))
+
+    ((maroon_relocations, maroon_time), (blue_relocations, blue_time)) = wave_stats
+    return StepStats(step, maroon_relocations, blue_relocations,
+                     len(counts.unsatisfied.get(home_value(grid, 'M'), ())),
+                     len(counts.unsatisfied.get(home_value(grid, 'B'), ())),
+                     maroon_time, blue_time, len(homes_for_sale))
+
+
+class StatsWriter(object):
+    '''
+    An observer that saves the StepStats for every step of a simulation
+    to a JSON Lines file as the simulation goes
+    '''
+    def __init__(self, filename, append=False):
+        '''
+        Constructor
+
+        Inputs:
+            filename (string): the name of the file to write
+            append (boolean): add to the end of the file, for a simulation
+              that picks up from a checkpoint, rather than replacing it
+        '''
+        self.file = open(filename, "a" if append else "w")
+
+    def __call__(self, step_stats):
+        self.file.write(json.dumps(step_stats._asdict()) + "\n")
+        self.file.flush()
+
+    def close(self):
+        '''
+        Close the file
+        '''
+        self.file.close()
+
+
+def do_simulation(grid, R, sim_sat_range, patience, max_steps, homes_for_sale,
+                  checkpoint_file=None, checkpoint_every=1, observer=None):
     '''
     Do a full simulation.
 
     Inputs:
-        grid (list of lists of strings): the grid
+        grid (list of lists of strings or array grid): the grid.  An array
+          grid (see utility.grid_to_array) is updated in place just like a
+          list of lists.
         R (int): neighborhood parameter
         sim_sat_range (float, float): lower bound and upper bound on
           the range (inclusive) for when the homeowner is satisfied
           with his similarity score.
         max_steps (int): maximum number of steps to do
-        for_sale (list of tuples): a list of locations with homes for sale
+        homes_for_sale (HomesForSale or list of tuples): the locations with
+          homes for sale.  A list is updated to the final order when the
+          simulation ends.
+        checkpoint_file (string): save a checkpoint of the simulation to
+          this file (see write_checkpoint), or None
+        checkpoint_every (int): the number of steps between checkpoints.
+          A checkpoint is also saved after the last step.
+        observer (function): called with a StepStats after every step, or
+          None.  The cost of timing the waves is only paid when there is
+          an observer.
 
     Returns: (int) The number of relocations completed.
     '''
-    total_relocations = 0
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint_every must be a positive integer")
 
-    for __ in range(max_steps):
-        num_relocations = simulation_step(grid, R, sim_sat_range, homes_for_sale, patience)
-        if num_relocations == 0:
-            break
+    return _simulate(grid, R, sim_sat_range, patience, max_steps,
+                     homes_for_sale, checkpoint_file, checkpoint_every,
+                     observer=observer)[0]
+
+
+def resume_simulation(checkpoint_file, R, sim_sat_range, patience, max_steps,
+                      checkpoint_every=1, observer=None):
+    '''
+    Pick up a simulation from a checkpoint saved by do_simulation and do
+    the rest of it.  The results are exactly the same as if the
+    simulation had never stopped.
+
+    Inputs:
+        checkpoint_file (string): the name of the checkpoint file, which
+          keeps being updated as the simulation goes on
+        R, sim_sat_range, patience: the parameters of the simulation,
+          which must match the checkpoint
+        max_steps (int): maximum number of steps to do, counting the steps
+          done before the checkpoint
+        checkpoint_every (int): the number of steps between checkpoints
+        observer (function): called with a StepStats after every step, or
+          None
+
+    Returns: (list of lists of strings, list of tuples, int) the final
+      grid, the homes for sale and the total number of relocations
+      completed
+    '''
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint_every must be a positive integer")
+
+    checkpoint = read_checkpoint(checkpoint_file)
+    if (checkpoint.R, checkpoint.sim_sat_range, checkpoint.patience) != \
+       (R, tuple(float(bound) for bound in sim_sat_range), patience):
+        raise ValueError(checkpoint_file + " is for a simulation with "
+                         + "different parameters")
+
+    grid = utility.array_to_grid(checkpoint.grid)
+    homes_for_sale = checkpoint.homes_for_sale
+    relocations = checkpoint.relocations
+    if not checkpoint.finished:
+        relocations, __ = _simulate(grid, R, sim_sat_range, patience,
+                                    max_steps, homes_for_sale,
+                                    checkpoint_file, checkpoint_every,
+                                    relocations, checkpoint.steps, observer)
+
+    return (grid, homes_for_sale, relocations)
+
+
+def _simulate(grid, R, sim_sat_range, patience, max_steps, homes_for_sale,
+              checkpoint_file=None, checkpoint_every=1, total_relocations=0,
+              steps=0, observer=None):
+    '''
+    Do a full simulation (see do_simulation), possibly picking up after
+    some steps have already been done.
+
+    Inputs:
+        total_relocations (int): the relocations done so far
+        steps (int): the steps done so far
+
+    Returns: (int, int) the number of relocations completed and the number
+      of steps taken, including a final step with no relocations.
+    '''
+    for_sale = homes_for_sale
+    if not isinstance(for_sale, HomesForSale):
+        for_sale = HomesForSale(homes_for_sale)
+
+    # Count each neighborhood once and keep the counts, and the sets of
+    # unsatisfied homeowners, up to date as homeowners move
+    counts = SatisfactionCache(grid, R, sim_sat_range)
+
+    while steps < max_steps:
+        if observer is None:
+            num_relocations = simulation_step(grid, R, sim_sat_range, for_sale,
+                                              patience, counts)
         else:
-            total_relocations += num_relocations
-    
-    return total_relocations
+            step_stats = simulation_step_with_stats(grid, R, sim_sat_range,
+                                                    for_sale, patience, counts,
+                                                    steps + 1)
+            observer(step_stats)
+            num_relocations = (step_stats.maroon_relocations
+                               + step_stats.blue_relocations)
+        steps += 1
+        total_relocations += num_relocations
+        finished = num_relocations == 0
+
+        if checkpoint_file is not None and \
+           (finished or steps == max_steps or steps % checkpoint_every == 0):
+            write_checkpoint(checkpoint_file,
+                             Checkpoint(grid, list(for_sale), total_relocations,
+                                        steps, finished, R, sim_sat_range,
+                                        patience))
+        if finished:
+            break
+
+    if for_sale is not homes_for_sale:
+        homes_for_sale[:] = for_sale
+
+    return (total_relocations, steps)
+
+
+def write_checkpoint(filename, checkpoint):
+    '''
+    Save a checkpoint of a simulation (see CHECKPOINT_MAGIC).  The file is
+    replaced in one go, so an interrupted save leaves the last checkpoint
+    in place.
+
+    Inputs:
+        filename (string): the name of the checkpoint file
+        checkpoint (Checkpoint): the state of the simulation
+    '''
+    grid = checkpoint.grid
+    if not isinstance(grid, np.ndarray):
+        grid = utility.grid_to_array(grid)
+
+    temp_filename = "{}.{}".format(filename, os.getpid())
+    with open(temp_filename, "wb") as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(np.array([len(grid), len(checkpoint.homes_for_sale),
+                          checkpoint.relocations, checkpoint.steps,
+                          checkpoint.finished, checkpoint.R,
+                          checkpoint.patience], dtype='<u8').tobytes())
+        f.write(np.array(checkpoint.sim_sat_range, dtype='<f8').tobytes())
+        f.write(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+        f.write(np.array(checkpoint.homes_for_sale,
+                         dtype='<u4').reshape(-1, 2).tobytes())
+    os.replace(temp_filename, filename)
+
+
+def read_checkpoint(filename):
+    '''
+    Load a checkpoint saved by write_checkpoint.
+
+    Inputs:
+        filename (string): the name of the checkpoint file
+
+    Returns: (Checkpoint) the state of the simulation, with an array grid
+      and the homes for sale as a list of tuples
+    '''
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) < CHECKPOINT_HEADER or not data.startswith(CHECKPOINT_MAGIC):
+        raise ValueError(filename + " is not a checkpoint file")
+
+    offset = len(CHECKPOINT_MAGIC)
+    (N, num_for_sale, relocations, steps, finished, R,
+     patience) = np.frombuffer(data, dtype='<u8', count=7, offset=offset).tolist()
+    sim_sat_range = tuple(np.frombuffer(data, dtype='<f8', count=2,
+                                        offset=offset + 7 * 8).tolist())
+    if len(data) != CHECKPOINT_HEADER + N * N + num_for_sale * 8:
+        raise ValueError(filename + " is not a checkpoint file")
+
+    grid = np.frombuffer(data, dtype=np.uint8, count=N * N,
+                         offset=CHECKPOINT_HEADER).reshape(N, N).copy()
+    homes_for_sale = [tuple(location) for location in np.frombuffer(
+        data, dtype='<u4', offset=CHECKPOINT_HEADER + N * N).reshape(
+            -1, 2).tolist()]
+
+    return Checkpoint(grid, homes_for_sale, relocations, steps, bool(finished),
+                      R, sim_sat_range, patience)
+
+
+def segregation_metrics(grid, R, sim_sat_range):
+    '''
+    Measure how segregated a grid is.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid
+        R (int): neighborhood parameter
+        sim_sat_range (float, float): lower bound and upper bound on
+          the satisfaction range (inclusive)
+
+    Returns: (dictionary) the average similarity score of the
+      homeowners and the share of them who are unsatisfied
+    '''
+    same_color, occupied = count_neighborhoods(grid, R)
+    is_occupied = occupied > 0
+    num_homeowners = int(np.count_nonzero(is_occupied))
+    if num_homeowners == 0:
+        return {"mean_similarity": 0.0, "share_unsatisfied": 0.0}
+
+    scores = same_color[is_occupied] / occupied[is_occupied]
+    num_satisfied = int(np.count_nonzero(
+        compute_satisfaction_map(grid, R, sim_sat_range)))
+
+    return {"mean_similarity": float(scores.mean()),
+            "share_unsatisfied": (num_homeowners - num_satisfied) / num_homeowners}
+
+
+SWEEP_FIELDS = ("R", "sim_lb", "sim_ub", "patience", "relocations", "steps",
+                "mean_similarity", "share_unsatisfied")
+
+
+def simulate_config(grid, config, max_steps):
+    '''
+    Do a full simulation for one configuration of a sweep.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the grid, which
+          is updated in place
+        config (int, float, float, int): R, the lower and upper bound on
+          the satisfaction range and the patience
+        max_steps (int): maximum number of steps to do
+
+    Returns: (dictionary) the configuration, the number of relocations
+      and steps, and the segregation metrics of the final grid (see
+      SWEEP_FIELDS)
+    '''
+    (R, sim_lb, sim_ub, patience) = config
+    sim_sat_range = (sim_lb, sim_ub)
+    for_sale = HomesForSale(utility.find_homes_for_sale(grid))
+
+    relocations, steps = _simulate(grid, R, sim_sat_range, patience,
+                                   max_steps, for_sale)
+
+    result = {"R": R, "sim_lb": sim_lb, "sim_ub": sim_ub,
+              "patience": patience, "relocations": relocations,
+              "steps": steps}
+    result.update(segregation_metrics(grid, R, sim_sat_range))
+    return result
+
+
+def simulate_shared_config(grid_name, shape, config, max_steps):
+    '''
+    Do a full simulation for one configuration of a sweep, starting
+    from a copy of an array grid held in shared memory.  The simulation
+    itself runs on a list of lists, which is faster to index one home at
+    a time.
+
+    Inputs:
+        grid_name (string): the name of the shared memory block
+        shape (int, int): the shape of the grid
+        config (int, float, float, int): see simulate_config
+        max_steps (int): maximum number of steps to do
+
+    Returns: (dictionary) see simulate_config
+    '''
+    shared = shared_memory.SharedMemory(name=grid_name)
+    try:
+        grid = utility.array_to_grid(
+            np.ndarray(shape, dtype=np.uint8, buffer=shared.buf))
+    finally:
+        shared.close()
+
+    return simulate_config(grid, config, max_steps)
+
+
+def sweep(grid, configs, max_steps, workers=None):
+    '''
+    Do a full simulation for each configuration, each starting from
+    the same grid.
+
+    Inputs:
+        grid (list of lists of strings or array grid): the starting grid,
+          which is not changed
+        configs (list of (int, float, float, int)): the configurations
+          to try (see simulate_config)
+        max_steps (int): maximum number of steps to do
+        workers (int): the number of processes to spread the
+          configurations across.  None or 1 runs them in this process.
+
+    Returns: (list of dictionaries) the result for each configuration,
+      in order
+    '''
+    if isinstance(grid, np.ndarray):
+        grid = np.ascontiguousarray(grid, dtype=np.uint8)
+    else:
+        grid = utility.grid_to_array(grid)
+
+    if workers is None or workers <= 1:
+        return [simulate_config(utility.array_to_grid(grid), config, max_steps)
+                for config in configs]
+
+    # Put the grid in shared memory once rather than pickling it for
+    # every configuration
+    shared = shared_memory.SharedMemory(create=True, size=max(1, grid.nbytes))
+    try:
+        np.ndarray(grid.shape, dtype=np.uint8, buffer=shared.buf)[:] = grid
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(simulate_shared_config, shared.name,
+                                       grid.shape, config, max_steps)
+                       for config in configs]
+            results = [future.result() for future in futures]
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return results
+
+
+def write_sweep_file(results, filename):
+    '''
+    Save the results of a sweep as a CSV file.
+
+    Inputs:
+        results (list of dictionaries): see sweep
+        filename (string): the name of the file
+    '''
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SWEEP_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def parse_values(values, kind):
+    '''
+    Parse a comma-separated list of values from the command line.
+
+    Inputs:
+        values (string): the list
+        kind (type): the type of each value
+
+    Returns: (list) the values
+    '''
+    return [kind(value) for value in values.split(",")]
+
+
+def print_final_grid(grid):
+    '''
+    Print the final state of a small city.
+
+    Inputs:
+        grid (list of lists of strings): the grid
+    '''
+    if len(grid) < 20:
+        print("Final state of the city:")
+        for row in grid:
+            print(row)
+        print()
 
 
-@click.command(name="schelling")
+@click.group(name="schelling", invoke_without_command=True)
+@click.pass_context
 @click.option('--grid_file', type=click.Path(exists=True))
 @click.option('--r', type=int, default=1,
               help="neighborhood radius")
@@ -204,18 +1115,52 @@ def do_simulation(grid, R, sim_sat_range, patience, max_steps, homes_for_sale):
               help="Upper bound of similarity range")
 @click.option('--patience', type=int, default=1, help="patience level")
 @click.option('--max_steps', type=int, default=1)
-def cmd(grid_file, r, sim_lb, sim_ub, patience, max_steps):
+@click.option('--checkpoint', type=click.Path(), default=None,
+              help="Save checkpoints of the simulation to this file")
+@click.option('--checkpoint_every', type=click.IntRange(min=1), default=1,
+              help="Number of steps between checkpoints")
+@click.option('--resume', is_flag=True,
+              help="Pick up the simulation from the checkpoint file")
+@click.option('--stats_file', type=click.Path(), default=None,
+              help="Save the stats for each step to this JSON Lines file")
+def cmd(ctx, grid_file, r, sim_lb, sim_ub, patience, max_steps, checkpoint,
+        checkpoint_every, resume, stats_file):
     '''
     Put it all together: do the simulation and process the results.
     '''
+    if ctx.invoked_subcommand is not None:
+        return
+
+    sim_sat_range = (sim_lb, sim_ub)
+    if resume:
+        if checkpoint is None or not os.path.isfile(checkpoint):
+            print("Error: --resume needs an existing checkpoint file")
+            return -1
+        observer = StatsWriter(stats_file, append=True) if stats_file else None
+        try:
+            grid, __, num_relocations = resume_simulation(
+                checkpoint, r, sim_sat_range, patience, max_steps,
+                checkpoint_every, observer)
+        except ValueError as e:
+            print("Error:", e)
+            return -1
+        finally:
+            if observer is not None:
+                observer.close()
+        print_final_grid(grid)
+        print("Total number of relocations done: " + str(num_relocations))
+        return
 
     if grid_file is None:
         print("No parameters specified...just loading the code")
         return
 
-    grid = utility.read_grid(grid_file)
-    for_sale = utility.find_homes_for_sale(grid)
-    sim_sat_range = (sim_lb, sim_ub)
+    try:
+        grid = utility.load_grid(grid_file, as_array=False)
+    except ValueError as e:
+        print("Error:", e)
+        return -1
+    for_sale = HomesForSale(utility.find_homes_for_sale(grid))
 
 
     if len(grid) < 20:
@@ -224,17 +1169,52 @@ def cmd(grid_file, r, sim_lb, sim_ub, patience, max_steps):
             print(row)
         print()
 
-    num_relocations = do_simulation(grid, r, sim_sat_range, patience,
-                                    max_steps, for_sale)
-
-    if len(grid) < 20:
-        print("Final state of the city:")
-        for row in grid:
-            print(row)
-        print()
+    observer = StatsWriter(stats_file) if stats_file else None
+    try:
+        num_relocations = do_simulation(grid, r, sim_sat_range, patience,
+                                        max_steps, for_sale, checkpoint,
+                                        checkpoint_every, observer)
+    finally:
+        if observer is not None:
+            observer.close()
 
+    print_final_grid(grid)
     print("Total number of relocations done: " + str(num_relocations))
 
 
+@cmd.command(name="sweep")
+@click.option('--grid_file', type=click.Path(exists=True), required=True)
+@click.option('--r', default="1", help="Comma-separated neighborhood radii")
+@click.option('--sim_lb', default="0.40",
+              help="Comma-separated lower bounds of similarity range")
+@click.option('--sim_ub', default="0.70",
+              help="Comma-separated upper bounds of similarity range")
+@click.option('--patience', default="1",
+              help="Comma-separated patience levels")
+@click.option('--max_steps', type=int, default=1)
+@click.option('--workers', type=int, default=1)
+@click.option('--output', type=click.Path(), default="sweep.csv")
+def sweep_cmd(grid_file, r, sim_lb, sim_ub, patience, max_steps, workers,
+              output):
+    '''
+    Do a simulation for every combination of the parameters and save
+    the results as a CSV file.
+    '''
+    try:
+        grid = utility.load_grid(grid_file)
+    except ValueError as e:
+        print("Error:", e)
+        return -1
+    configs = list(itertools.product(parse_values(r, int),
+                                     parse_values(sim_lb, float),
+                                     parse_values(sim_ub, float),
+                                     parse_values(patience, int)))
+
+    results = sweep(grid, configs, max_steps, workers)
+    write_sweep_file(results, output)
+    print("Saved the results of {} simulations to {}".format(len(results),
+                                                             output))
+
+
 if __name__ == "__main__":
     cmd() # pylint: disable=no-value-for-parameter
\ No newline at end of file
@@ -4,6 +4,7 @@ CS121: Schelling Model of Housing Segregation
 Test code for do_simulation
 """
 
+import json
 import os
 import sys
 import pytest
@@ -26,6 +27,7 @@ BASE_DIR = os.path.dirname(__file__)
 #pylint: disable-msg=missing-docstring
 
 from schelling import do_simulation
+import schelling
 import test_helpers
 import utility
 
@@ -46,7 +48,7 @@ def count_homeowners(grid):
                 num_homeowners += 1
     return num_homeowners
 
-def helper_test_do_simulation(params):
+def helper_test_do_simulation(params, as_array=False):
     '''Do one simulation with the specified parameters
 
     Match actual grid generated with the expected grid and match
@@ -54,6 +56,7 @@ def helper_test_do_simulation(params):
 
     Inputs:
         params: dictionary with the test parameters.
+        as_array: (boolean) simulate on an array grid
     '''
 
     input_filename = os.path.join(TEST_DIR, params["input_filename"])
@@ -62,7 +65,7 @@ def helper_test_do_simulation(params):
     patience = params["patience"]
     max_num_steps = params["max_num_steps"]
 
-    actual_grid = utility.read_grid(input_filename)
+    actual_grid = utility.read_grid(input_filename, as_array=as_array)
     if not params["initial_for_sale"]:
         init_for_sale = utility.find_homes_for_sale(actual_grid)
     else:
@@ -138,3 +141,185 @@ def test_do_simulation_medium(params):
     test_helpers.read_config_file("test_do_simulation_large.json"))
 def test_do_simulation_large(params):
     helper_test_do_simulation(params)
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_do_simulation_small.json") +
+    test_helpers.read_config_file("test_do_simulation_medium.json"))
+def test_do_simulation_array(params):
+    helper_test_do_simulation(params, as_array=True)
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_do_simulation_small.json") +
+    test_helpers.read_config_file("test_do_simulation_medium.json"))
+def test_do_simulation_homes_for_sale(params):
+    '''
+    Check that do_simulation leaves the homes for sale in the same order
+    as stepping the simulation with a plain list.
+    '''
+    input_filename = os.path.join(TEST_DIR, params["input_filename"])
+    R = params["R"]
+    sim_sat_range = tuple(params["sim_sat_range"])
+    patience = params["patience"]
+
+    expected_grid = utility.read_grid(input_filename)
+    expected_for_sale = utility.find_homes_for_sale(expected_grid)
+    for __ in range(params["max_num_steps"]):
+        if not schelling.simulation_step(expected_grid, R, sim_sat_range,
+                                         expected_for_sale, patience):
+            break
+
+    actual_grid = utility.read_grid(input_filename)
+    actual_for_sale = utility.find_homes_for_sale(actual_grid)
+    do_simulation(actual_grid, R, sim_sat_range, patience,
+                  params["max_num_steps"], actual_for_sale)
+
+    assert actual_grid == expected_grid
+    assert actual_for_sale == expected_for_sale
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep(workers):
+    '''
+    Check that each configuration of a sweep matches doing the
+    simulation on its own.
+    '''
+    input_filename = os.path.join(TEST_DIR, "grid-ten.txt")
+    grid = utility.read_grid(input_filename)
+    before = [row[:] for row in grid]
+    configs = [(1, 0.4, 0.7, 1), (2, 0.45, 0.55, 3), (3, 0.45, 0.55, 10)]
+    max_steps = 5
+
+    results = schelling.sweep(grid, configs, max_steps, workers)
+    assert grid == before
+
+    for config, result in zip(configs, results):
+        (R, sim_lb, sim_ub, patience) = config
+        expected_grid = utility.read_grid(input_filename)
+        num_relocations = do_simulation(
+            expected_grid, R, (sim_lb, sim_ub), patience, max_steps,
+            utility.find_homes_for_sale(expected_grid))
+
+        assert (result["R"], result["sim_lb"], result["sim_ub"],
+                result["patience"]) == config
+        assert result["relocations"] == num_relocations
+        assert 1 <= result["steps"] <= max_steps
+        assert result == schelling.simulate_config(
+            utility.read_grid(input_filename), config, max_steps)
+        num_homeowners = 100 - len(utility.find_homes_for_sale(expected_grid))
+        num_unsatisfied = sum(
+            1 for i, row in enumerate(expected_grid)
+            for j, home in enumerate(row)
+            if home != "F" and
+            not schelling.is_satisfied(expected_grid, R, (i, j),
+                                       (sim_lb, sim_ub)))
+        assert result["share_unsatisfied"] == num_unsatisfied / num_homeowners
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_do_simulation_medium.json"))
+@pytest.mark.parametrize("checkpoint_every", [1, 2])
+def test_resume_simulation(params, checkpoint_every, tmp_path):
+    '''
+    Check that stopping a simulation and picking it up from its
+    checkpoint gives the same results as doing it all at once.
+    '''
+    input_filename = os.path.join(TEST_DIR, params["input_filename"])
+    R = params["R"]
+    sim_sat_range = tuple(params["sim_sat_range"])
+    patience = params["patience"]
+    max_steps = params["max_num_steps"]
+    checkpoint_file = str(tmp_path / "simulation.ckpt")
+
+    expected_grid = utility.read_grid(input_filename)
+    expected_for_sale = utility.find_homes_for_sale(expected_grid)
+    expected_relocations = do_simulation(expected_grid, R, sim_sat_range,
+                                         patience, max_steps,
+                                         expected_for_sale)
+
+    grid = utility.read_grid(input_filename)
+    do_simulation(grid, R, sim_sat_range, patience, 1,
+                  utility.find_homes_for_sale(grid), checkpoint_file,
+                  checkpoint_every)
+    assert schelling.read_checkpoint(checkpoint_file).steps == 1
+
+    for __ in range(2):
+        actual_grid, actual_for_sale, actual_relocations = \
+            schelling.resume_simulation(checkpoint_file, R, sim_sat_range,
+                                        patience, max_steps, checkpoint_every)
+        assert actual_grid == expected_grid
+        assert actual_for_sale == expected_for_sale
+        assert actual_relocations == expected_relocations
+
+    with pytest.raises(ValueError):
+        schelling.resume_simulation(checkpoint_file, R + 1, sim_sat_range,
+                                    patience, max_steps)
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_do_simulation_small.json") +
+    test_helpers.read_config_file("test_do_simulation_medium.json"))
+def test_do_simulation_observer(params, tmp_path):
+    '''
+    Check the stats reported for each step of a simulation.
+    '''
+    input_filename = os.path.join(TEST_DIR, params["input_filename"])
+    R = params["R"]
+    sim_sat_range = tuple(params["sim_sat_range"])
+    patience = params["patience"]
+
+    grid = utility.read_grid(input_filename)
+    for_sale = utility.find_homes_for_sale(grid)
+    stats = []
+
+    def observer(step_stats):
+        stats.append(step_stats)
+        for color, num_unsatisfied in (("M", step_stats.maroon_unsatisfied),
+                                       ("B", step_stats.blue_unsatisfied)):
+            assert num_unsatisfied == sum(
+                1 for i, row in enumerate(grid) for j, home in enumerate(row)
+                if home == color and
+                not schelling.is_satisfied(grid, R, (i, j), sim_sat_range))
+
+    num_relocations = do_simulation(grid, R, sim_sat_range, patience,
+                                    params["max_num_steps"], for_sale,
+                                    observer=observer)
+
+    assert num_relocations == params["expected_num_relocations"]
+    assert [step_stats.step for step_stats in stats] == \
+        list(range(1, len(stats) + 1))
+    assert sum(step_stats.maroon_relocations + step_stats.blue_relocations
+               for step_stats in stats) == num_relocations
+    assert all(step_stats.homes_for_sale == len(for_sale)
+               for step_stats in stats)
+
+    stats_file = str(tmp_path / "stats.jsonl")
+    writer = schelling.StatsWriter(stats_file)
+    for step_stats in stats:
+        writer(step_stats)
+    writer.close()
+    with open(stats_file) as f:
+        assert [schelling.StepStats(**json.loads(line)) for line in f] == stats
+
+
+@pytest.mark.parametrize("checkpoint_every", [0, -1])
+def test_checkpoint_every_positive(checkpoint_every, tmp_path):
+    input_filename = os.path.join(TEST_DIR, "grid-ten.txt")
+    grid = utility.read_grid(input_filename)
+    checkpoint_file = str(tmp_path / "simulation.ckpt")
+
+    with pytest.raises(ValueError):
+        do_simulation(grid, 1, (0.4, 0.7), 1, 5,
+                      utility.find_homes_for_sale(grid), checkpoint_file,
+                      checkpoint_every)
+
+    do_simulation(grid, 1, (0.4, 0.7), 1, 1,
+                  utility.find_homes_for_sale(grid), checkpoint_file)
+    with pytest.raises(ValueError):
+        schelling.resume_simulation(checkpoint_file, 1, (0.4, 0.7), 1, 5,
+                                    checkpoint_every)
@@ -9,6 +9,7 @@ schelling.py
 
 import os
 import sys
+import numpy as np
 import pytest
 
 import test_helpers
@@ -69,3 +70,161 @@ def test_is_satisfied(params):
                              tuple(params["location"]),
                              tuple(params["sim_sat_range"]),
                              params["expected_result"])
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_is_satisfied.json"))
+def test_is_satisfied_with_counts(params):
+    full_path = os.path.join(TEST_DIR, params["filename"])
+    grid = utility.read_grid(full_path)
+    counts = schelling.NeighborhoodCounts(grid, params["R"])
+
+    actual = schelling.is_satisfied(grid, params["R"],
+                                    tuple(params["location"]),
+                                    tuple(params["sim_sat_range"]),
+                                    counts)
+    assert actual == params["expected_result"]
+
+
+@pytest.mark.parametrize(
+    "params",
+    test_helpers.read_config_file("test_is_satisfied.json"))
+def test_is_satisfied_array(params):
+    full_path = os.path.join(TEST_DIR, params["filename"])
+    grid = utility.read_grid(full_path, as_array=True)
+    assert utility.array_to_grid(grid) == utility.read_grid(full_path)
+
+    actual = schelling.is_satisfied(grid, params["R"],
+                                    tuple(params["location"]),
+                                    tuple(params["sim_sat_range"]))
+    assert actual == params["expected_result"]
+
+
+@pytest.mark.parametrize("grid", [[["B", "X"], ["UM", "F"]],
+                                  [["B", "M"], ["F", ""]],
+                                  [["B", "M"], ["F", None]]])
+def test_grid_to_array_bad_home(grid):
+    with pytest.raises(ValueError):
+        utility.grid_to_array(grid)
+    with pytest.raises(ValueError):
+        schelling.compute_satisfaction_map(grid, 1, (0.4, 0.7))
+    with pytest.raises(ValueError):
+        schelling.NeighborhoodCounts(grid, 1)
+
+
+@pytest.mark.parametrize("R", [1, 2, 3])
+def test_neighborhood_counts_after_swaps(R):
+    full_path = os.path.join(TEST_DIR, "grid-ten.txt")
+    grid = utility.read_grid(full_path)
+    counts = schelling.NeighborhoodCounts(grid, R)
+
+    for open_home in utility.find_homes_for_sale(grid)[:5]:
+        homeowner = next((i, j) for i, row in enumerate(grid)
+                         for j, home in enumerate(row) if home != "F")
+        schelling.swap_homes(grid, open_home, homeowner, counts)
+
+    expected = schelling.NeighborhoodCounts(grid, R)
+    assert counts.occupied == expected.occupied
+    assert counts.same_color == expected.same_color
+
+
+@pytest.mark.parametrize("R", [1, 2, 3])
+def test_satisfaction_cache_after_moves(R):
+    full_path = os.path.join(TEST_DIR, "grid-ten.txt")
+    grid = utility.read_grid(full_path)
+    sim_sat_range = (0.4, 0.7)
+    cache = schelling.SatisfactionCache(grid, R, sim_sat_range)
+
+    for open_home in utility.find_homes_for_sale(grid)[:5]:
+        homeowner = next((i, j) for i, row in enumerate(grid)
+                         for j, home in enumerate(row) if home != "F")
+        schelling.swap_homes(grid, open_home, homeowner, cache)
+
+    for color in ("B", "M"):
+        expected = {(i, j) for i, row in enumerate(grid)
+                    for j, home in enumerate(row)
+                    if home == color and
+                    not schelling.is_satisfied(grid, R, (i, j), sim_sat_range)}
+        assert cache.unsatisfied[color] == expected
+
+
+@pytest.mark.parametrize("R", [1, 2, 3])
+def test_score_if_moved(R):
+    full_path = os.path.join(TEST_DIR, "grid-ten.txt")
+    grid = utility.read_grid(full_path)
+    counts = schelling.NeighborhoodCounts(grid, R)
+    before = [row[:] for row in grid]
+
+    homeowners = [(i, j) for i, row in enumerate(grid)
+                  for j, home in enumerate(row) if home != "F"]
+    for homeowner in homeowners:
+        for target in utility.find_homes_for_sale(grid):
+            schelling.swap_homes(grid, target, homeowner)
+            (i, j) = target
+            S, H = schelling.count_neighborhood(grid, R, target, grid[i][j])
+            schelling.swap_homes(grid, homeowner, target)
+
+            assert schelling.score_if_moved(grid, R, homeowner, target) == S / H
+            assert schelling.score_if_moved(grid, R, homeowner, target,
+                                            counts) == S / H
+
+    assert grid == before
+
+
+@pytest.mark.parametrize("filename", ["a20-sample-writeup.txt",
+                                      "grid-ten.txt", "large-grid.txt"])
+@pytest.mark.parametrize("R", [1, 2, 3, 6])
+@pytest.mark.parametrize("sim_sat_range", [(0.4, 0.7), (0.5, 0.5),
+                                           (0.0, 1.0), (0.35, 0.75)])
+def test_compute_satisfaction_map(filename, R, sim_sat_range):
+    full_path = os.path.join(TEST_DIR, filename)
+    grid = utility.read_grid(full_path)
+
+    expected = [[home != "F" and
+                 schelling.is_satisfied(grid, R, (i, j), sim_sat_range)
+                 for j, home in enumerate(row)]
+                for i, row in enumerate(grid)]
+    for g in (grid, utility.grid_to_array(grid)):
+        actual = schelling.compute_satisfaction_map(g, R, sim_sat_range)
+        assert actual.tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "filename",
+    [f for f in os.listdir(TEST_DIR) if f.endswith(".txt") and f != "README.txt"])
+def test_load_grid(filename, tmp_path):
+    grid_file = tmp_path / filename
+    grid_file.write_bytes(open(os.path.join(TEST_DIR, filename), "rb").read())
+    expected = utility.read_grid(str(grid_file))
+
+    assert utility.load_grid(str(grid_file), as_array=False) == expected
+    assert os.path.exists(str(grid_file) + utility.GRID_CACHE_SUFFIX)
+
+    cached = utility.load_grid(str(grid_file))
+    assert isinstance(cached, np.memmap)
+    assert utility.array_to_grid(cached) == expected
+
+    # Changing the grid through the cache leaves the cache alone
+    cached[:] = utility.GRID_CODES["F"]
+    assert utility.load_grid(str(grid_file), as_array=False) == expected
+
+
+def test_load_grid_modified(tmp_path):
+    grid_file = tmp_path / "grid.txt"
+    grid_file.write_text("B M\nF B\n")
+    assert utility.load_grid(str(grid_file), as_array=False) == \
+        [["B", "M"], ["F", "B"]]
+
+    grid_file.write_text("M M F\nF B B\nB F M\n")
+    assert utility.load_grid(str(grid_file), as_array=False) == \
+        [["M", "M", "F"], ["F", "B", "B"], ["B", "F", "M"]]
+
+
+@pytest.mark.parametrize("text", [b"", b"B M\nB\n", b"B X\nB M\n",
+                                  b"B  M\nB M\n", b"B M F\nB M F\n"])
+def test_load_grid_format_error(text, tmp_path):
+    grid_file = tmp_path / "grid.txt"
+    grid_file.write_bytes(text)
+    with pytest.raises(ValueError):
+        utility.load_grid(str(grid_file))
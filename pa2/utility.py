@@ -8,8 +8,29 @@ import csv
 import os
 import sys
 
+import numpy as np
+
 ALLOWED_VALUES = ("B", "M", "F")
 
+# The code for each kind of home in an array grid, which stores one uint8
+# per home instead of a one-character string
+GRID_CODES = {"F": 0, "B": 1, "M": 2}
+GRID_VALUES = np.array(["F", "B", "M"], dtype=object)
+
+# The code for each byte that can stand for a home in a grid file, or
+# NOT_A_HOME
+NOT_A_HOME = 255
+BYTE_CODES = np.full(256, NOT_A_HOME, dtype=np.uint8)
+for _home, _code in GRID_CODES.items():
+    BYTE_CODES[ord(_home)] = _code
+
+# load_grid saves each grid it parses next to the grid file, in a binary
+# cache file with this suffix.  The header holds the size and modification
+# time of the grid file, to tell whether the cache is still good, and N.
+GRID_CACHE_SUFFIX = ".gridcache"
+GRID_CACHE_MAGIC = b"SCHGRID1"
+GRID_CACHE_HEADER = len(GRID_CACHE_MAGIC) + 3 * 8
+
 ############################################################################
 # The first three functions in this file might be useful for hand-testing  #
 # and debugging.  Students should NOT call any of these functions in their #
@@ -18,13 +39,15 @@ ALLOWED_VALUES = ("B", "M", "F")
 
 
 
-def read_grid(filename, allowed=ALLOWED_VALUES):
+def read_grid(filename, allowed=ALLOWED_VALUES, as_array=False):
     '''
     Read a grid from a text file and return the corresponding
     in-memory representation.
 
     Inputs:
         filename: (string) the name of the grid file to read
+        as_array: (boolean) return an array grid (see grid_to_array)
+          instead of a list of lists
 
     Returns: (list of list of strings) the grid contained in file f.
     '''
@@ -55,8 +78,204 @@ def read_grid(filename, allowed=ALLOWED_VALUES):
             print("File is empty")
             sys.exit(0)
 
+        if as_array:
+            return grid_to_array(grid)
         return grid
 
+
+def load_grid(filename, as_array=True, use_cache=True):
+    '''
+    Read a grid of B, M and F homes from a text file.  Unlike read_grid,
+    the file is checked and converted with array operations rather than
+    row by row, and a bad file raises an exception rather than exiting.
+
+    The grid is saved in a binary cache file next to the grid file (see
+    GRID_CACHE_SUFFIX).  Later loads of the same, unmodified file memory
+    map the cache copy-on-write instead of parsing the text again.
+
+    Inputs:
+        filename: (string) the name of the grid file to read
+        as_array: (boolean) return an array grid rather than a list of
+          lists
+        use_cache: (boolean) read and write the cache file
+
+    Returns: (ndarray of uint8 or list of lists of strings) the grid
+
+    Raises: FileNotFoundError if there is no such file, ValueError if the
+      file is not a grid
+    '''
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cache_filename = filename + GRID_CACHE_SUFFIX
+
+    array = read_grid_cache(cache_filename, key) if use_cache else None
+    if array is None:
+        with open(filename, "rb") as f:
+            array = parse_grid(f.read())
+        if use_cache:
+            try:
+                write_grid_cache(cache_filename, key, array)
+            except OSError:
+                pass
+
+    if as_array:
+        return array
+    return array_to_grid(array)
+
+
+def parse_grid(text):
+    '''
+    Convert the contents of a grid file to an array grid.
+
+    Inputs:
+        text: (bytes) the contents of the file: one line per row, with
+          the homes in the row separated by single spaces.  The first
+          line may hold N on its own.
+
+    Returns: (ndarray of uint8) the array grid
+
+    Raises: ValueError if the text is not a grid
+    '''
+    text = text.replace(b"\r\n", b"\n")
+    if not text.endswith(b"\n"):
+        text += b"\n"
+
+    first_line = text[:text.index(b"\n")]
+    if b" " not in first_line:
+        # old format with N in the file
+        text = text[len(first_line) + 1:]
+    if not text:
+        raise ValueError("File is empty")
+
+    row_length = text.index(b"\n") + 1
+    N = row_length // 2
+    chars = np.frombuffer(text, dtype=np.uint8)
+    if row_length % 2 or chars.size % row_length:
+        raise_row_error(text)
+    chars = chars.reshape(-1, row_length)
+
+    spaces = chars[:, 1:-1:2]
+    if np.any(chars[:, -1] != ord("\n")) or np.any(spaces != ord(" ")):
+        raise_row_error(text)
+
+    array = BYTE_CODES[chars[:, ::2]]
+    if np.any(array == NOT_A_HOME):
+        raise_row_error(text)
+    if array.shape[0] != N:
+        raise ValueError("Format error: the grid has {} rows and {} columns".format(
+            array.shape[0], N))
+
+    return array
+
+
+def raise_row_error(text):
+    '''
+    Find the first row of a grid file that is not the same length as the
+    first row, or has an entry other than B, M or F, and report it.
+
+    Inputs:
+        text: (bytes) the contents of the file, without the line for N
+
+    Raises: ValueError
+    '''
+    rows = text.split(b"\n")[:-1]
+    N = len(rows[0].split(b" "))
+    allowed = {home.encode() for home in ALLOWED_VALUES}
+    for i, line in enumerate(rows):
+        row = line.split(b" ")
+        if len(row) != N:
+            raise ValueError("Format error in line {}: row is wrong length".format(i))
+        if set(row) - allowed:
+            break
+    raise ValueError(("Format error in line {}: row has "
+                      + "entry other than {}").format(i, "/".join(ALLOWED_VALUES)))
+
+
+def read_grid_cache(filename, key):
+    '''
+    Load an array grid from a cache file written by write_grid_cache.  The
+    file is memory mapped copy-on-write, so changes to the grid are never
+    saved to it.
+
+    Inputs:
+        filename: (string) the name of the cache file
+        key: (int, int) the modification time, in nanoseconds, and size of
+          the grid file
+
+    Returns: (ndarray of uint8) the array grid, or None if there is no
+      cache file or it is for a different version of the grid file
+    '''
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(GRID_CACHE_HEADER)
+    except OSError:
+        return None
+    if len(header) != GRID_CACHE_HEADER or \
+       not header.startswith(GRID_CACHE_MAGIC):
+        return None
+
+    mtime, size, N = np.frombuffer(header[len(GRID_CACHE_MAGIC):], dtype='<u8').tolist()
+    if (mtime, size) != key or \
+       os.path.getsize(filename) != GRID_CACHE_HEADER + N * N:
+        return None
+
+    return np.memmap(filename, dtype=np.uint8, mode='c',
+                     offset=GRID_CACHE_HEADER, shape=(N, N))
+
+
+def write_grid_cache(filename, key, array):
+    '''
+    Save an array grid to a cache file.
+
+    Inputs:
+        filename: (string) the name of the cache file
+        key: (int, int) the modification time, in nanoseconds, and size of
+          the grid file
+        array: (ndarray of uint8) the array grid
+    '''
+    temp_filename = "{}.{}".format(filename, os.getpid())
+    with open(temp_filename, "wb") as f:
+        f.write(GRID_CACHE_MAGIC)
+        f.write(np.array(key + (len(array),), dtype='<u8').tobytes())
+        f.write(np.ascontiguousarray(array, dtype=np.uint8).tobytes())
+    os.replace(temp_filename, filename)
+
+
+def grid_to_array(grid):
+    '''
+    Convert a grid to an array grid: an N x N uint8 array holding the
+    code (see GRID_CODES) for each home.
+
+    Inputs:
+        grid: (list of lists of strings)
+
+    Returns: (ndarray of uint8) the array grid
+
+    Raises: ValueError if a home is not B, M or F
+    '''
+    homes = np.asarray(grid, dtype=object)
+    array = np.full(homes.shape, NOT_A_HOME, dtype=np.uint8)
+    for home, code in GRID_CODES.items():
+        array[homes == home] = code
+
+    if np.any(array == NOT_A_HOME):
+        (i, j) = np.argwhere(array == NOT_A_HOME)[0].tolist()
+        raise ValueError("Home at ({}, {}) is {!r}, not one of {}".format(
+            i, j, grid[i][j], "/".join(ALLOWED_VALUES)))
+    return array
+
+
+def array_to_grid(array):
+    '''
+    Convert an array grid back to a list of lists of strings.
+
+    Inputs:
+        array: (ndarray of uint8) an array grid
+
+    Returns: (list of lists of strings) the grid
+    '''
+    return GRID_VALUES[array].tolist()
+
 def print_grid(grid):
     '''
     Print a text representation of a grid.
@@ -80,6 +299,10 @@ def find_homes_for_sale(grid):
     Returns a list with the unoccupied locations represented as pairs.
     '''
 
+    if isinstance(grid, np.ndarray):
+        return [tuple(location)
+                for location in np.argwhere(grid == GRID_CODES["F"]).tolist()]
+
     grid_size = len(grid)
     unoccupied_locations = []
 
@@ -116,13 +339,17 @@ def is_grid(grid):
     allowed values.
 
     Inputs:
-        grid: (list of lists of strings)
+        grid: (list of lists of strings or an array grid)
 
     Returns: boolean
 
     '''
     max_small_grid = 20
 
+    if isinstance(grid, np.ndarray):
+        return grid.ndim == 2 and grid.shape[0] == grid.shape[1] > 0 and \
+            bool(np.all(grid < len(GRID_VALUES)))
+
     if not isinstance(grid, list):
         return False
 
@@ -162,6 +389,11 @@ def find_mismatch(grid0, grid1):
     assert is_grid(grid0) and is_grid(grid1), \
         "Grids are not lists of lists of strings."
 
+    if isinstance(grid0, np.ndarray):
+        grid0 = array_to_grid(grid0)
+    if isinstance(grid1, np.ndarray):
+        grid1 = array_to_grid(grid1)
+
     assert len(grid0) == len(grid1), \
         "Grids are not the same shape."
 
@@ -4,8 +4,10 @@ Analyze module
 
 import unicodedata
 import sys
+from collections import deque
 
-from basic_algorithms import find_top_k, find_min_count, find_salient
+from basic_algorithms import find_salient, count_tokens, \
+    find_top_k_from_counts, find_min_count_from_counts
 
 ##################### DO NOT MODIFY THIS CODE #####################
 
@@ -46,17 +48,29 @@ def create_entities_lst(tweets, entity_desc):
     
     Returns: a list of entities
     '''
-    entities = []
+    return list(iter_entities(tweets, entity_desc))
+
+
+def iter_entities(tweets, entity_desc):
+    '''
+    Generates the entities described by the entity_desc parameter, one
+    tweet at a time
+
+    Inputs:
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
+        entity_desc: a triple ("hashtags", "text", True),
+          ("user_mentions", "screen_name", False), etc
+
+    Returns: a generator of entities
+    '''
     key, subkey, is_case_sensitive = entity_desc
 
     for tweet in tweets:
         for entities_dictionary in tweet["entities"][key]:
             if is_case_sensitive:
-                entities.append(entities_dictionary[subkey])
+                yield entities_dictionary[subkey]
             else:
-                entities.append(entities_dictionary[subkey].lower())
-    
-    return entities
+                yield entities_dictionary[subkey].lower()
 
 
 def find_top_k_entities(tweets, entity_desc, k):
@@ -64,14 +78,14 @@ def find_top_k_entities(tweets, entity_desc, k):
     Find the k most frequently occuring entitites
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
         entity_desc: a triple ("hashtags", "text", True),
           ("user_mentions", "screen_name", False), etc
         k: integer
 
     Returns: list of entities
     '''
-    return find_top_k(create_entities_lst(tweets, entity_desc), k)
+    return find_top_k_from_counts(count_tokens(iter_entities(tweets, entity_desc)), k)
 
 
 def find_min_count_entities(tweets, entity_desc, min_count):
@@ -79,14 +93,15 @@ def find_min_count_entities(tweets, entity_desc, min_count):
     Find the entitites that occur at least min_count times.
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
         entity_desc: a triple ("hashtags", "text", True),
           ("user_mentions", "screen_name", False), etc
         min_count: integer
 
     Returns: set of entities
     '''
-    return find_min_count(create_entities_lst(tweets, entity_desc), min_count)
+    return find_min_count_from_counts(count_tokens(iter_entities(tweets, entity_desc)),
+                                      min_count)
 
 ############## Part 3 ##############
 
@@ -101,20 +116,46 @@ def preprocess_tweet(tweet, case_sensitive, is_remove_stop_words=True):
     
     Returns: a list of qualifying words
     '''
-    qualifying_words = []
+    return list(iter_words(tweet, case_sensitive, is_remove_stop_words))
 
+
+def iter_words(tweet, case_sensitive, is_remove_stop_words=True):
+    '''
+    Generates the qualifying words of a tweet (see preprocess_tweet)
+
+    Inputs:
+        tweet: a tweet (dictionary)
+        case_sensitive: boolean
+        is_remove_stop_words: boolean
+
+    Returns: a generator of qualifying words
+    '''
     for word in tweet['abridged_text'].split():
         word = word.strip(PUNCTUATION)
         if not case_sensitive:
             word = word.lower()
-        if is_remove_stop_words:
-            if word != "" and word not in STOP_WORDS and not word.startswith(STOP_PREFIXES):
-                qualifying_words.append(word)
-        else:
-            if word != "" and not word.startswith(STOP_PREFIXES):
-                qualifying_words.append(word)
-    
-    return qualifying_words
+        if word != "" and not word.startswith(STOP_PREFIXES) and \
+           not (is_remove_stop_words and word in STOP_WORDS):
+            yield word
+
+
+def iter_n_grams(words, n):
+    '''
+    Generates the n-grams in a sequence of words, sliding one window
+    over the words rather than slicing out each n-gram
+
+    Inputs:
+        words: an iterable of words
+        n: a non-negative integer
+
+    Returns: a generator of n-grams (tuples of n words)
+    '''
+    window = deque(maxlen=n)
+
+    for word in words:
+        window.append(word)
+        if len(window) == n:
+            yield tuple(window)
 
 
 def create_n_grams(tweet, case_sensitive, n, is_remove_stop_words):
@@ -129,15 +170,25 @@ def create_n_grams(tweet, case_sensitive, n, is_remove_stop_words):
     
     Returns: a list of n-grams for a tweet
     '''
-    n_grams_lst = []
+    return list(iter_n_grams(iter_words(tweet, case_sensitive, is_remove_stop_words), n))
 
-    qualifying_words = preprocess_tweet(tweet, case_sensitive, is_remove_stop_words)
 
-    for index, __ in enumerate(qualifying_words):
-        if index + n <= len(qualifying_words):
-            n_grams_lst.append(tuple(qualifying_words[index: index + n]))
+def count_n_grams(tweets, case_sensitive, n):
+    '''
+    Counts the n-grams in a collection of tweets (with stop words
+    removed).  The n-grams go straight from the tweets to the counts,
+    without building a list of words or n-grams along the way.
 
-    return n_grams_lst
+    Inputs:
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
+        case_sensitive: boolean
+        n: an integer
+
+    Returns: dictionary that maps n-grams to counts
+    '''
+    return count_tokens(n_gram for tweet in tweets
+                        for n_gram in iter_n_grams(iter_words(tweet, case_sensitive),
+                                                   n))
 
 
 def find_top_k_ngrams(tweets, n, case_sensitive, k):
@@ -145,19 +196,14 @@ def find_top_k_ngrams(tweets, n, case_sensitive, k):
     Find k most frequently occurring n-grams
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
         n: integer
         case_sensitive: boolean
         k: integer
 
     Returns: list of n-grams
     '''
-    n_grams_lst = []
-
-    for tweet in tweets:
-        n_grams_lst.extend(create_n_grams(tweet, case_sensitive, n, True))
-    
-    return find_top_k(n_grams_lst, k)
+    return find_top_k_from_counts(count_n_grams(tweets, case_sensitive, n), k)
 
 
 def find_min_count_ngrams(tweets, n, case_sensitive, min_count):
@@ -165,19 +211,15 @@ def find_min_count_ngrams(tweets, n, case_sensitive, min_count):
     Find n-grams that occur at least min_count times.
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets, such as a list or util.iter_tweets
         n: integer
         case_sensitive: boolean
         min_count: integer
 
     Returns: set of n-grams
     '''
-    n_grams_lst = []
-
-    for tweet in tweets:
-        n_grams_lst.extend(create_n_grams(tweet, case_sensitive, n, True))
-    
-    return find_min_count(n_grams_lst, min_count)
+    return find_min_count_from_counts(count_n_grams(tweets, case_sensitive, n),
+                                      min_count)
 
 
 def find_salient_ngrams(tweets, n, case_sensitive, threshold):
@@ -15,7 +15,7 @@ You may add helper functions.
 """
 
 import math
-from util import sort_count_pairs
+from util import find_top_count_pairs
 
 
 def count_tokens(tokens):
@@ -49,7 +49,24 @@ def find_top_k(tokens, k):
     if k < 0:
         raise ValueError("In find_top_k, k must be a non-negative integer")
 
-    return [token for (token, __) in sort_count_pairs(list(count_tokens(tokens).items()))[:k]]
+    return find_top_k_from_counts(count_tokens(tokens), k)
+
+
+def find_top_k_from_counts(token_cnts, k):
+    '''
+    Find the k most frequently occuring tokens, given the count of each
+    token
+
+    Inputs:
+        token_cnts: dictionary that maps tokens to counts
+        k: a non-negative integer
+
+    Returns: list of the top k tokens ordered by count.
+    '''
+    if k < 0:
+        raise ValueError("In find_top_k, k must be a non-negative integer")
+
+    return [token for (token, __) in find_top_count_pairs(token_cnts.items(), k)]
 
 
 def find_min_count(tokens, min_count):
@@ -66,7 +83,24 @@ def find_min_count(tokens, min_count):
     if min_count < 0:
         raise ValueError("min_count must be a non-negative integer")
 
-    return {token for (token, cnt) in sort_count_pairs(list(count_tokens(tokens).items())) if cnt >= min_count}
+    return find_min_count_from_counts(count_tokens(tokens), min_count)
+
+
+def find_min_count_from_counts(token_cnts, min_count):
+    '''
+    Find the tokens that occur *at least* min_count times, given the
+    count of each token
+
+    Inputs:
+        token_cnts: dictionary that maps tokens to counts
+        min_count: a non-negative integer
+
+    Returns: set of tokens
+    '''
+    if min_count < 0:
+        raise ValueError("min_count must be a non-negative integer")
+
+    return {token for (token, cnt) in token_cnts.items() if cnt >= min_count}
 
 
 def tf_score(term, doc):
@@ -102,6 +136,72 @@ def idf_score(term, docs):
     return math.log(len(docs) / term_appearances)
 
 
+class TfIdfIndex(object):
+    '''
+    The counts needed to compute tf-idf scores for a collection of
+    documents: the count of each term in each document, the largest count
+    in each document and the number of documents each term appears in.
+    Scores match tf_score and idf_score exactly, but each one costs O(1)
+    instead of a pass over the document or the whole collection.
+    '''
+    def __init__(self, docs):
+        '''
+        Constructor
+
+        Inputs:
+            docs: a collection of documents (list of lists of strings)
+        '''
+        self.num_docs = len(docs)
+        self.term_cnts = []
+        self.max_cnts = []
+        self.doc_freqs = {}
+
+        for doc in docs:
+            term_cnts = count_tokens(doc)
+            self.term_cnts.append(term_cnts)
+            self.max_cnts.append(max(term_cnts.values(), default=0))
+            for term in term_cnts:
+                self.doc_freqs[term] = self.doc_freqs.get(term, 0) + 1
+
+    def tf_score(self, term, doc_index):
+        '''
+        Computes the tf score for a term in a document
+
+        Inputs:
+            term: a word (string)
+            doc_index: the position of the document in the collection
+
+        Returns: tf score (float)
+        '''
+        return 0.5 + 0.5 * (self.term_cnts[doc_index][term] / self.max_cnts[doc_index])
+
+    def idf_score(self, term):
+        '''
+        Computes the idf score for a term in the collection
+
+        Inputs:
+            term: a word (string)
+
+        Returns: idf score (float)
+        '''
+        return math.log(self.num_docs / self.doc_freqs[term])
+
+    def find_salient(self, threshold):
+        '''
+        Compute the salient words for each document (see find_salient).
+
+        Inputs:
+          threshold: float
+
+        Returns: list of sets of salient words
+        '''
+        idf_scores = {term: self.idf_score(term) for term in self.doc_freqs}
+
+        return [{term for term in term_cnts
+                 if self.tf_score(term, doc_index) * idf_scores[term] > threshold}
+                for doc_index, term_cnts in enumerate(self.term_cnts)]
+
+
 def find_salient(docs, threshold):
     '''
     Compute the salient words for each document.  A word is salient if
@@ -113,14 +213,4 @@ def find_salient(docs, threshold):
 
     Returns: list of sets of salient words
     '''
-    salient_words = []
-
-    for doc in docs:
-        salient_set = set()
-        for term in doc:
-            tf_idf_score = tf_score(term, doc) * idf_score(term, docs)
-            if tf_idf_score > threshold:
-                salient_set.add(term)
-        salient_words.append(salient_set)
-    
-    return salient_words
+    return TfIdfIndex(docs).find_salient(threshold)
@@ -1,17 +1,38 @@
 """
 Load the tweets for the Analyze Candidate Tweets assignment.
+
+The tweets for each account are read from the data directory the first
+time they are used.  To go through a large file without keeping every
+tweet in memory, use util.iter_tweets instead.
 """
 
+import sys
+
 import util
 
-Conservatives = util.get_json_from_file("data/Conservatives.json")
-UKLabour = util.get_json_from_file("data/UKLabour.json")
-theSNP = util.get_json_from_file("data/theSNP.json")
-LibDems = util.get_json_from_file("data/LibDems.json")
+TWEET_FILES = {"Conservatives": "data/Conservatives.json",
+               "UKLabour": "data/UKLabour.json",
+               "theSNP": "data/theSNP.json",
+               "LibDems": "data/LibDems.json"}
 
 # sample tweet from the "Data" section
-tweet0 = UKLabour[651]
+SAMPLE_TWEETS = {"tweet0": ("UKLabour", 651),
+                 # sample tweet from the "Pre-processing step" and
+                 # "Representing N-grams" sections.
+                 "tweet1": ("UKLabour", 55)}
+
+
+def __getattr__(name):
+    '''
+    Load the tweets for an account, or a sample tweet, on first use.
+    '''
+    if name in TWEET_FILES:
+        value = list(util.iter_tweets(TWEET_FILES[name]))
+    elif name in SAMPLE_TWEETS:
+        account, index = SAMPLE_TWEETS[name]
+        value = getattr(sys.modules[__name__], account)[index]
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-# sample tweet from the "Pre-processing step" and "Representing
-# N-grams" sections.
-tweet1 = UKLabour[55]
+    globals()[name] = value
+    return value
@@ -8,9 +8,11 @@ import os
 import sys
 
 import json
+import tracemalloc
 import pytest
 
 import analyze
+import util
 
 from test_helpers import read_config_file, \
     compare_lists, compare_sets, compare_list_of_lists
@@ -200,3 +202,97 @@ def test_find_salient_ngrams(params):
 
 
     compare_list_of_lists(actual, params, recreate_msg)
+
+
+SAMPLE_TWEETS = [{"abridged_text": "Vote for the NHS #GE2017",
+                  "entities": {"hashtags": [{"text": "GE2017"}],
+                               "user_mentions": []}},
+                 {"abridged_text": "Strong and stable, \u2603 [yes]",
+                  "entities": {"hashtags": [{"text": "ge2017"},
+                                            {"text": "NHS"}],
+                               "user_mentions": [{"screen_name": "UKLabour"}]}},
+                 {"abridged_text": "",
+                  "entities": {"hashtags": [], "user_mentions": []}}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+@pytest.mark.parametrize("layout", ["array", "indented", "lines"])
+def test_iter_tweets(chunk_size, layout, tmp_path):
+    '''
+    test code for util.iter_tweets
+    '''
+    tweets_file = tmp_path / "tweets.json"
+    if layout == "lines":
+        tweets_file.write_text("\n".join(json.dumps(tweet)
+                                         for tweet in SAMPLE_TWEETS) + "\n")
+    else:
+        tweets_file.write_text(json.dumps(SAMPLE_TWEETS,
+                                          indent=2 if layout == "indented" else None))
+
+    tweets = util.iter_tweets(str(tweets_file), chunk_size)
+    assert not isinstance(tweets, list)
+    assert list(tweets) == SAMPLE_TWEETS
+
+    entity_desc = ("hashtags", "text", False)
+    assert analyze.find_top_k_entities(
+        util.iter_tweets(str(tweets_file), chunk_size), entity_desc, 2) == \
+        ["ge2017", "nhs"]
+    assert analyze.find_min_count_entities(
+        util.iter_tweets(str(tweets_file), chunk_size), entity_desc, 2) == \
+        {"ge2017"}
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4])
+@pytest.mark.parametrize("case_sensitive", [True, False])
+def test_count_n_grams(n, case_sensitive):
+    '''
+    test code for the n-gram pipeline
+    '''
+    n_grams = []
+    for tweet in SAMPLE_TWEETS:
+        words = analyze.preprocess_tweet(tweet, case_sensitive)
+        expected = [tuple(words[i:i + n]) for i in range(len(words) - n + 1)]
+        assert list(analyze.iter_n_grams(iter(words), n)) == expected
+        assert analyze.create_n_grams(tweet, case_sensitive, n, True) == expected
+        n_grams.extend(expected)
+
+    assert analyze.count_n_grams(iter(SAMPLE_TWEETS), case_sensitive, n) == \
+        {n_gram: n_grams.count(n_gram) for n_gram in n_grams}
+
+
+@pytest.mark.parametrize("layout", ["array", "lines"])
+def test_iter_tweets_malformed(layout, tmp_path):
+    '''
+    test that util.iter_tweets reports a malformed tweet without reading
+    the rest of the file
+    '''
+    tweets_file = tmp_path / "tweets.json"
+    tweet = json.dumps(SAMPLE_TWEETS[1])
+    if layout == "lines":
+        tweets_file.write_text("\n".join([tweet, "{bad"] + [tweet] * 20000))
+    else:
+        tweets_file.write_text("[" + ", ".join([tweet, "{bad"] + [tweet] * 20000) + "]")
+
+    tweets = util.iter_tweets(str(tweets_file), 256, 4096)
+    assert next(tweets) == SAMPLE_TWEETS[1]
+
+    tracemalloc.start()
+    try:
+        with pytest.raises(json.JSONDecodeError):
+            next(tweets)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 64 * 1024
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5])
+def test_iter_tweets_numbers(chunk_size, tmp_path):
+    '''
+    test that util.iter_tweets reads numbers cut off by a chunk boundary
+    '''
+    tweets_file = tmp_path / "tweets.json"
+    tweets_file.write_text("[1.5e3, 2, -0.25 ,7]")
+
+    assert list(util.iter_tweets(str(tweets_file), chunk_size)) == \
+        [1500.0, 2, -0.25, 7]
@@ -11,6 +11,7 @@ import pytest
 
 import test_helpers
 import basic_algorithms
+import util
 
 # Want to catch any exception thrown by student code.
 #pylint: disable-msg=broad-except
@@ -60,6 +61,42 @@ def test_top_k(params):
     run_test(basic_algorithms.find_top_k, params, "items", "k")
 
 
+@pytest.mark.parametrize("k", [0, 1, 2, 5, 40, 100])
+def test_find_top_count_pairs(k):
+    '''
+    Test sort_count_pairs and find_top_count_pairs against sorting with
+    cmp_count_tuples
+    '''
+    pairs = [(key, count) for count in range(5)
+             for key in ("D", "C", "AA", "A", "B", "c", "E", "BB")[count:]]
+    expected = sorted(pairs, key=util.cmp_to_key(util.cmp_count_tuples))
+
+    assert util.sort_count_pairs(pairs) == expected
+    assert util.find_top_count_pairs(pairs, k) == expected[:k]
+    assert util.find_top_count_pairs(iter(pairs), k) == expected[:k]
+    assert util.find_top_count_pairs(iter(pairs), k, len(pairs)) == expected[:k]
+
+    counts = dict(pairs)
+    assert util.find_top_count_pairs(counts.items(), k) == \
+        sorted(counts.items(), key=util.cmp_to_key(util.cmp_count_tuples))[:k]
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 10])
+def test_from_counts(n):
+    '''
+    Test find_top_k_from_counts and find_min_count_from_counts
+    '''
+    tokens = ["A", "B", "C", "A", "D", "B", "A", "E", "C", "A", "F", "B"]
+    token_cnts = basic_algorithms.count_tokens(tokens)
+
+    assert basic_algorithms.find_top_k_from_counts(token_cnts, n) == \
+        basic_algorithms.find_top_k(tokens, n)
+    assert basic_algorithms.find_min_count_from_counts(token_cnts, n) == \
+        {token for token in tokens if tokens.count(token) >= n}
+    assert basic_algorithms.find_min_count(tokens, n) == \
+        basic_algorithms.find_min_count_from_counts(token_cnts, n)
+
+
 @pytest.mark.parametrize(
     "params",
     test_helpers.read_config_file("find_min_count.json"))
@@ -85,3 +122,28 @@ def test_find_salient(params):
     params["expected"] = [set(words) for words in params["expected"]]
 
     run_test(basic_algorithms.find_salient, params, "items", "threshold")
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.2, 0.5, 1.0])
+def test_tf_idf_index(threshold):
+    '''
+    Test TfIdfIndex against tf_score and idf_score
+    '''
+    docs = [["red", "fish", "blue", "fish"], ["one", "fish", "two", "fish"],
+            ["red", "red", "red"], [], ["blue", "two", "one", "one"]]
+    index = basic_algorithms.TfIdfIndex(docs)
+
+    expected = []
+    for doc_index, doc in enumerate(docs):
+        salient = set()
+        for term in doc:
+            tf = basic_algorithms.tf_score(term, doc)
+            idf = basic_algorithms.idf_score(term, docs)
+            assert index.tf_score(term, doc_index) == tf
+            assert index.idf_score(term) == idf
+            if tf * idf > threshold:
+                salient.add(term)
+        expected.append(salient)
+
+    assert index.find_salient(threshold) == expected
+    assert basic_algorithms.find_salient(docs, threshold) == expected
@@ -4,9 +4,37 @@ Analyzing Election Tweets
 Utility functions
 '''
 
+import heapq
 import sys
 import json
 
+# iter_tweets reads JSON arrays this many characters at a time, and gives
+# up on a tweet in an array that is still not complete after this many
+# characters
+TWEET_CHUNK_SIZE = 1 << 16
+MAX_TWEET_SIZE = 1 << 20
+
+# find_top_count_pairs keeps a heap of the top k pairs, rather than
+# sorting all of them, when there are at least this many pairs per pair
+# kept
+TOP_K_HEAP_RATIO = 8
+
+
+def count_pair_key(pair):
+    '''
+    Sort key for a pair that puts pairs in the same order as
+    cmp_count_tuples: second value in non-increasing order, then first
+    value in non-decreasing order.  The second value must be a number.
+
+    Inputs:
+       pair: a (key, count) pair
+
+    Returns: tuple
+    '''
+    (key, count) = pair
+    return (-count, key)
+
+
 def sort_count_pairs(l):
     '''
     Sort pairs using the second value as the primary sort key and the
@@ -26,7 +54,37 @@ def sort_count_pairs(l):
     In [3]: util.sort_count_pairs([('C', 2), ('A', 3), ('B', 7), ('D', 5)])
     Out[3]: [('B', 7), ('D', 5), ('A', 3), ('C', 2)]
     '''
-    return list(sorted(l, key=cmp_to_key(cmp_count_tuples)))
+    return sorted(l, key=count_pair_key)
+
+
+def find_top_count_pairs(l, k, num_pairs=None):
+    '''
+    Find the first k pairs in the order used by sort_count_pairs.  When k
+    is much smaller than the number of pairs, the pairs are run through a
+    heap of size k instead of being sorted, so they are never copied.
+
+    Inputs:
+       l: iterable of pairs, such as a list or the items of a dictionary
+       k: a non-negative integer
+       num_pairs: the number of pairs, for an iterable without a length.
+         Without it, such an iterable is copied into a list.
+
+    Returns: list of at most k key/value pairs
+
+    Example use:
+    In [1]: import util
+
+    In [2]: util.find_top_count_pairs([('D', 5), ('C', 2), ('A', 3), ('B', 2)], 2)
+    Out[2]: [('D', 5), ('A', 3)]
+    '''
+    if num_pairs is None:
+        if not hasattr(l, "__len__"):
+            l = list(l)
+        num_pairs = len(l)
+
+    if k * TOP_K_HEAP_RATIO <= num_pairs:
+        return heapq.nsmallest(k, l, key=count_pair_key)
+    return sort_count_pairs(l)[:k]
 
 #Make lint be quiet.
 #pylint: disable-msg=unused-argument, too-few-public-methods
@@ -112,3 +170,106 @@ def get_json_from_file(filename):
     except OSError as e:
         print(e, file=sys.stderr)
         sys.exit(1)
+
+
+def iter_tweets(filename, chunk_size=TWEET_CHUNK_SIZE, max_tweet_size=MAX_TWEET_SIZE):
+    '''
+    Read tweets from a file one at a time, without loading the whole
+    file.  The file can hold a JSON array of tweets or one tweet per
+    line (JSON Lines).
+
+    Inputs:
+      filename: string with name of the file to read
+      chunk_size: the number of characters to read at a time from a
+        JSON array
+      max_tweet_size: the largest number of characters a tweet in a JSON
+        array may take up.  A tweet that is malformed is reported once
+        this much of the file has been read, at most.
+
+    Returns: generator of tweets
+
+    Example use:
+    In [1]: import util
+
+    In [2]: tweets = util.iter_tweets("data/Conservatives.json")
+
+    In [3]: next(tweets)["abridged_text"]
+    '''
+    with open(filename, encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        while buf.isspace():
+            buf = f.read(chunk_size)
+
+        if not buf.lstrip().startswith("["):
+            # A tweet cannot span lines, so a bad line is reported
+            # without reading past it
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        yield from iter_json_array(f, buf, buf.index("[") + 1, chunk_size,
+                                   max_tweet_size)
+
+
+def iter_json_array(f, buf, pos, chunk_size, max_tweet_size):
+    '''
+    Read the values in a JSON array one at a time (see iter_tweets).
+
+    Inputs:
+      f: the file, open for reading just past the text in buf
+      buf: string with the text read from the file so far
+      pos: the position in buf just after the opening bracket
+      chunk_size: the number of characters to read at a time
+      max_tweet_size: the largest number of characters a value may take up
+
+    Returns: generator of values
+    '''
+    decoder = json.JSONDecoder()
+    at_eof = False
+
+    while True:
+        # Skip to the start of the next value, reading more of the file
+        # whenever the buffer runs out
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) or at_eof:
+                break
+            buf = f.read(chunk_size)
+            pos = 0
+            at_eof = not buf
+
+        if pos == len(buf):
+            raise ValueError(f.name + ": JSON array is not closed")
+        if buf[pos] == "]":
+            return
+
+        # Decode a value, reading more of the file while the value may
+        # not be complete.  A value is only complete once the next
+        # character after it is a comma or the closing bracket: a number
+        # cut off by the end of the buffer ("1.5e") still decodes.
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                after = end
+                while after < len(buf) and buf[after].isspace():
+                    after += 1
+                if after < len(buf) and buf[after] in ",]":
+                    break
+                if at_eof and after == len(buf):
+                    # Leave the missing bracket to be reported below
+                    break
+                if at_eof or len(buf) - pos > max_tweet_size:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, after)
+            except json.JSONDecodeError:
+                if at_eof or len(buf) - pos > max_tweet_size:
+                    raise
+            more = f.read(chunk_size)
+            at_eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+
+        yield value
+        pos = end